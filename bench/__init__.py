@@ -0,0 +1,9 @@
+# bench/__init__.py
+"""
+오프라인 벤치마크 (네트워크 / OpenAI 없이 실행)
+
+    python -m bench --output bench_result.json
+
+로컬 HTTP 서버로 fixtures/ HTML을 제공하고, 가짜 LLM과 작은 로컬 임베딩/리랭커 모델로
+수집 → 검색 → 리랭크 → 생성 단계별 시간, 최대 RSS, 인덱스 크기, recall@k / MRR을 측정한다.
+"""
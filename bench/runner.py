@@ -0,0 +1,333 @@
+# bench/runner.py
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import statistics
+from typing import Dict, List
+
+from bench.server import FixtureServer, FIXTURES_DIR
+from bench.startup import measure_startup, check_budget
+
+# 로컬 캐시에 있는 작은 모델 (HF_HUB_OFFLINE=1로 실행하므로 미리 받아 두어야 함)
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Ctrl + F5 오프라인 벤치마크")
+    parser.add_argument("--stacks", nargs="*", help="측정할 스택 (기본: fixtures/stacks.json 전체)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--fetch-k", type=int, default=None, help="기본: max(20, top_k * 3)")
+    parser.add_argument("--search-type", choices=["mmr", "similarity"], default="mmr")
+    parser.add_argument("--no-rerank", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--chunk-overlap", type=int, default=None)
+    parser.add_argument("--embedding-model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--reranker-model", default=DEFAULT_RERANKER_MODEL)
+    parser.add_argument("--output", help="결과 JSON 경로 (기본: stdout)")
+    parser.add_argument("--workdir", help="인덱스/캐시 작업 디렉터리 (기본: 임시 디렉터리, 종료 시 삭제)")
+    parser.add_argument("--compare-compact", action="store_true", help="float32 저장과 컴팩트 저장의 크기/벡터 검색 품질 비교")
+    parser.add_argument("--compact-dims", type=int, default=256)
+    parser.add_argument("--compact-dtype", choices=["int8", "float16", "float32"], default="int8")
+    parser.add_argument("--compare-cascade", action="store_true", help="전체 리랭크와 cascade 리랭크의 채점 쌍 수/지연 시간/품질 비교")
+    parser.add_argument("--enforce-budget", action="store_true", help="콜드 스타트 지연 시간 예산 초과 시 종료 코드 1")
+    return parser.parse_args(argv)
+
+def _configure_env(workdir: str, args):
+    """core 모듈 import 전에 경로/모델 설정 (모듈 상수가 import 시점에 환경 변수를 읽음)"""
+    os.environ["CTRLF5_DB_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["CTRLF5_HTTP_CACHE_DIR"] = os.path.join(workdir, "http_cache")
+    os.environ["CTRLF5_EMBED_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite")
+    os.environ["CTRLF5_EMBEDDING_MODEL"] = args.embedding_model
+    os.environ["CTRLF5_RERANKER_MODEL"] = args.reranker_model
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+def _summary(values: List[float]) -> Dict:
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+def _peak_rss_mb() -> float:
+    # Linux: KB, macOS: bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def _first_relevant_rank(docs, relevant: List[str]):
+    for rank, doc in enumerate(docs, start=1):
+        source = doc.metadata.get("source", "")
+        if any(source.endswith(r) for r in relevant):
+            return rank
+    return None
+
+def _recall(docs, relevant: List[str]) -> float:
+    sources = [d.metadata.get("source", "") for d in docs]
+    found = sum(1 for r in relevant if any(s.endswith(r) for s in sources))
+    return found / len(relevant) if relevant else 0.0
+
+def _load_questions(stack: str) -> List[Dict]:
+    path = os.path.join(FIXTURES_DIR, "questions", f"{stack}.jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _vector_quality(stack: str, questions: List[Dict], top_k: int, search_type: str) -> Dict:
+    """벡터 검색 단독 recall@k / MRR / 지연 시간 (저장 방식 비교용)"""
+    from core.database import load_vectorstore, describe_storage, get_collection_storage
+    from core.engine import HybridRetriever
+
+    vectorstore = load_vectorstore(stack)
+    retriever = HybridRetriever(
+        vectorstore=vectorstore, fetch_k=top_k, search_type=search_type,
+        storage=get_collection_storage(vectorstore._collection.name)
+    )
+    recall, rr, latency = [], [], []
+    for item in questions:
+        start = time.perf_counter()
+        docs = retriever.invoke(item["question"])
+        latency.append(time.perf_counter() - start)
+        rank = _first_relevant_rank(docs, item["relevant"])
+        recall.append(_recall(docs, item["relevant"]))
+        rr.append(1.0 / rank if rank else 0.0)
+    return {
+        "storage": describe_storage(vectorstore),
+        f"recall@{top_k}": statistics.fmean(recall) if recall else None,
+        "mrr": statistics.fmean(rr) if rr else None,
+        "latency": _summary(latency),
+    }
+
+def compare_storage(stack: str, questions: List[Dict], args) -> Dict:
+    """현재(float32) 저장과 컴팩트 저장 비교 (비교 후 스택은 컴팩트 상태로 남음)"""
+    from core.compact import make_storage
+    from core.database import migrate_collection
+
+    report = {"float32": _vector_quality(stack, questions, args.top_k, args.search_type)}
+    start = time.perf_counter()
+    migrate_collection(stack, make_storage(dims=args.compact_dims or None, dtype=args.compact_dtype))
+    report["migrate_seconds"] = time.perf_counter() - start
+    report["compact"] = _vector_quality(stack, questions, args.top_k, args.search_type)
+    return report
+
+def compare_rerank(reranker, samples: List[Dict], top_k: int) -> Dict:
+    """같은 1차 후보로 full / cascade 리랭크 비교 (매 질의 점수 캐시를 비워 실제 추론 비용 측정)"""
+    from core.engine import rerank_documents, cascade_rerank_documents
+    from core.metrics import trace
+    from core.rerank import get_score_cache
+
+    report = {}
+    for mode, fn in (("full", rerank_documents), ("cascade", cascade_rerank_documents)):
+        latency, pairs, recall, rr = [], [], [], []
+        for item in samples:
+            get_score_cache(reranker).clear()
+            with trace() as rerank_trace:
+                start = time.perf_counter()
+                docs = fn(reranker, item["question"], item["candidates"], top_k)
+                latency.append(time.perf_counter() - start)
+            pairs.append(rerank_trace.stats.get("rerank_pairs", 0))
+            rank = _first_relevant_rank(docs, item["relevant"])
+            recall.append(_recall(docs, item["relevant"]))
+            rr.append(1.0 / rank if rank else 0.0)
+        report[mode] = {
+            "pairs_per_query": statistics.fmean(pairs) if pairs else None,
+            "latency": _summary(latency),
+            f"recall@{top_k}": statistics.fmean(recall) if recall else None,
+            "mrr": statistics.fmean(rr) if rr else None,
+        }
+    return report
+
+def run_stack(stack: str, paths: List[str], server: FixtureServer, args) -> Dict:
+    from langchain_core.language_models import FakeListChatModel
+    from core.database import load_vectorstore
+    from core.engine import build_hybrid_retriever, build_qa_chain, get_rag_chain, rerank_documents
+    from core.ingest import run_ingestion
+    from core.model_loader import load_reranker_model
+    from core.metrics import trace
+    from core.rerank import get_score_cache
+
+    urls = [server.url(p) for p in paths]
+    fake_llm = FakeListChatModel(responses=["벤치마크용 고정 답변입니다."])
+    fetch_k = args.fetch_k or max(20, args.top_k * 3)
+    report = {"urls": len(urls)}
+
+    # --- 수집 (최초 구축 + 변경 없는 재수집) ---
+    start = time.perf_counter()
+    ingest = run_ingestion(urls, stack)
+    report["ingest"] = {
+        "wall": time.perf_counter() - start,
+        "stage_busy_seconds": ingest["stage_seconds"],
+        "chunks": ingest["chunks"],
+        "errors": ingest["errors"],
+    }
+    start = time.perf_counter()
+    refresh = run_ingestion(urls, stack)
+    report["refresh"] = {
+        "wall": time.perf_counter() - start,
+        "stage_busy_seconds": refresh["stage_seconds"],
+        "embedded": refresh["embed"],
+        "not_modified": refresh["not_modified"],
+    }
+
+    # --- 검색 인덱스 (BM25 역색인 로드, 색인이 없던 컬렉션이면 재색인 포함) ---
+    vectorstore = load_vectorstore(stack)
+    start = time.perf_counter()
+    hybrid = build_hybrid_retriever(vectorstore, fetch_k, search_type=args.search_type)
+    report["bm25_build"] = time.perf_counter() - start
+
+    reranker = None if args.no_rerank else load_reranker_model()
+    qa_chain = build_qa_chain(fake_llm, stack, True)
+    rag_chain = get_rag_chain(
+        vectorstore, stack, is_strict=True, relevance_threshold=0.0, top_k=args.top_k,
+        llm=fake_llm, fetch_k=fetch_k, search_type=args.search_type, rerank=not args.no_rerank
+    )
+
+    # --- 질의 ---
+    timings = {"retrieval": [], "rerank": [], "generation": [], "end_to_end": []}
+    quality = {"hybrid": {"recall": [], "rr": []}, "final": {"recall": [], "rr": []}}
+    context = {"context_tokens": [], "context_tokens_saved": []}
+    questions = _load_questions(stack)
+    rerank_samples = []
+
+    # 모델 warm-up 후 첫 질의: 다른 경로가 리랭커/점수 캐시를 건드리기 전에 전체 체인으로 측정
+    report["first_answer"] = None
+    if questions:
+        if reranker is not None:
+            get_score_cache(reranker).clear()
+        start = time.perf_counter()
+        rag_chain.invoke({"input": questions[0]["question"], "chat_history": []})
+        report["first_answer"] = time.perf_counter() - start
+
+    for item in questions:
+        question, relevant = item["question"], item["relevant"]
+
+        start = time.perf_counter()
+        candidates = hybrid.invoke(question)
+        timings["retrieval"].append(time.perf_counter() - start)
+        rerank_samples.append({"question": question, "candidates": candidates, "relevant": relevant})
+
+        if reranker is not None:
+            start = time.perf_counter()
+            final_docs = rerank_documents(reranker, question, candidates, args.top_k)
+            timings["rerank"].append(time.perf_counter() - start)
+        else:
+            final_docs = candidates[:args.top_k]
+
+        start = time.perf_counter()
+        qa_chain.invoke({"input": question, "chat_history": [], "context": final_docs})
+        timings["generation"].append(time.perf_counter() - start)
+
+        # 위 리랭크 단계가 채운 점수 캐시를 비워 end-to-end에 실제 리랭크 추론 비용 포함
+        if reranker is not None:
+            get_score_cache(reranker).clear()
+        start = time.perf_counter()
+        with trace() as answer_trace:
+            rag_chain.invoke({"input": question, "chat_history": []})
+        timings["end_to_end"].append(time.perf_counter() - start)
+        for name, values in context.items():
+            values.append(answer_trace.stats.get(name, 0))
+
+        for name, docs in (("hybrid", candidates[:args.top_k]), ("final", final_docs)):
+            rank = _first_relevant_rank(docs, relevant)
+            quality[name]["recall"].append(_recall(docs, relevant))
+            quality[name]["rr"].append(1.0 / rank if rank else 0.0)
+
+    report["query"] = {name: _summary(values) for name, values in timings.items()}
+    report["context"] = {name: _summary(values) for name, values in context.items()}
+    report["quality"] = {
+        name: {
+            f"recall@{args.top_k}": statistics.fmean(q["recall"]) if q["recall"] else None,
+            "mrr": statistics.fmean(q["rr"]) if q["rr"] else None,
+        }
+        for name, q in quality.items()
+    }
+    report["questions"] = len(questions)
+    if args.compare_cascade and reranker is not None:
+        report["rerank_modes"] = compare_rerank(reranker, rerank_samples, args.top_k)
+    if args.compare_compact:
+        report["storage"] = compare_storage(stack, questions, args)
+    return report
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ctrlf5-bench-")
+    _configure_env(workdir, args)
+
+    from core import database
+    from core.model_loader import load_embedding_model, load_reranker_model
+
+    if args.chunk_size:
+        database.CHUNK_SIZE = args.chunk_size
+    if args.chunk_overlap is not None:
+        database.CHUNK_OVERLAP = args.chunk_overlap
+
+    with open(os.path.join(FIXTURES_DIR, "stacks.json"), "r", encoding="utf-8") as f:
+        stacks = json.load(f)
+    selected = args.stacks or list(stacks)
+
+    result = {
+        "config": {
+            "top_k": args.top_k,
+            "fetch_k": args.fetch_k or max(20, args.top_k * 3),
+            "search_type": args.search_type,
+            "rerank": not args.no_rerank,
+            "chunk_size": database.CHUNK_SIZE,
+            "chunk_overlap": database.CHUNK_OVERLAP,
+            "embedding_model": args.embedding_model,
+            "reranker_model": None if args.no_rerank else args.reranker_model,
+        },
+        "stacks": {},
+    }
+
+    try:
+        # 새 인터프리터에서 측정해야 하므로 이 프로세스에서 모델을 로딩하기 전에 실행
+        result["startup"] = measure_startup()
+
+        start = time.perf_counter()
+        load_embedding_model()
+        if not args.no_rerank:
+            load_reranker_model()
+        result["model_load"] = time.perf_counter() - start
+
+        with FixtureServer() as server:
+            for stack in selected:
+                result["stacks"][stack] = run_stack(stack, stacks[stack], server, args)
+
+        first_answers = [s["first_answer"] for s in result["stacks"].values() if s.get("first_answer") is not None]
+        result["budget"] = check_budget({
+            "startup_import": result["startup"]["import"]["seconds"],
+            "first_answer": max(first_answers) if first_answers else None,
+        })
+        result["index_bytes"] = _dir_size(database.DB_PATH)
+        result["peak_rss_mb"] = _peak_rss_mb()
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    over = [name for name, b in result["budget"].items() if not b["ok"]]
+    if over:
+        print(f"⚠️ 지연 시간 예산 초과: {over}", file=sys.stderr)
+    return 1 if over and args.enforce_budget else 0
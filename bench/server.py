@@ -0,0 +1,36 @@
+# bench/server.py
+import os
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    # SimpleHTTPRequestHandler는 If-Modified-Since 요청에 304를 돌려준다 (HTTP 캐시 재검증 확인용)
+    def log_message(self, format, *args):
+        pass
+
+class FixtureServer:
+    """fixtures 디렉터리를 127.0.0.1의 임의 포트로 제공하는 로컬 HTTP 서버"""
+
+    def __init__(self, directory: str = FIXTURES_DIR):
+        handler = partial(_QuietHandler, directory=directory)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
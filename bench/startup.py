@@ -0,0 +1,64 @@
+# bench/startup.py
+"""
+콜드 스타트 측정 (새 인터프리터에서 실행)
+- 첫 화면 경로 모듈 import 시간과, 그 시점에 무거운 모듈이 로딩되었는지
+- 백그라운드 warm-up(엔진 모듈 import, 임베딩/리랭커 로딩 + 첫 추론) 구성 요소별 시간
+"""
+import os
+import sys
+import json
+import subprocess
+from typing import Dict
+
+# main.py가 첫 화면 전에 import하는 core 모듈 (streamlit 제외)
+STARTUP_MODULES = ["core.database", "core.metrics", "core.jobs", "core.warmup"]
+# 첫 화면 전에 로딩되면 안 되는 모듈
+HEAVY_MODULES = ["torch", "sentence_transformers", "chromadb", "langchain_chroma",
+                 "langchain_classic", "langchain_community", "langchain_openai"]
+
+# 지연 시간 예산 (초). 작은 벤치마크 모델 기준
+BUDGET = {
+    "startup_import": 2.0,
+    "first_answer": 3.0,
+}
+
+_IMPORT_SNIPPET = """
+import sys, json, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "heavy_modules_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+_WARMUP_SNIPPET = """
+import json, time
+from core.warmup import start_warmup, wait_until_ready, get_warmup_status
+start = time.perf_counter()
+start_warmup()
+wait_until_ready()
+print(json.dumps({"seconds": time.perf_counter() - start, "components": get_warmup_status()}))
+"""
+
+def _run_python(code: str) -> Dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=root, env=os.environ.copy(),
+        capture_output=True, text=True, check=True,
+    )
+    # warm-up 경고 등 다른 출력이 섞일 수 있으므로 마지막 줄만 사용
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def measure_startup() -> Dict:
+    return {
+        "import": _run_python(_IMPORT_SNIPPET.format(modules=STARTUP_MODULES, heavy=HEAVY_MODULES)),
+        "warmup": _run_python(_WARMUP_SNIPPET),
+    }
+
+def check_budget(values: Dict[str, float]) -> Dict[str, Dict]:
+    return {
+        name: {"value": values.get(name), "limit": limit, "ok": values.get(name) is not None and values[name] <= limit}
+        for name, limit in BUDGET.items()
+    }
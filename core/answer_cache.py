@@ -0,0 +1,152 @@
+# core/answer_cache.py
+import time
+import threading
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+from core.database import get_collection_name, get_collection_version
+from core.model_loader import load_embedding_model
+
+ANSWER_CACHE_THRESHOLD = 0.95      # 코사인 유사도 (bge-m3 정규화 임베딩)
+ANSWER_CACHE_TTL = 24 * 60 * 60    # 초
+ANSWER_CACHE_MAX_ENTRIES = 500     # (스택, 엄격 모드)별 최대 항목 수
+COLLECTION_SEPARATOR = "+"         # 여러 스택 검색 시 캐시 키
+
+class SemanticAnswerCache:
+    """
+    (컬렉션, 엄격 모드)별 질문 임베딩 → 답변/근거 문서 캐시
+    컬렉션 버전이 바뀌면(재구축) 해당 스택 항목은 자동 폐기된다.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[tuple, List[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def _valid_entries(self, key: tuple, version: int) -> List[Dict]:
+        now = time.time()
+        entries = [
+            e for e in self._entries.get(key, [])
+            if e["version"] == version and now - e["created_at"] <= self.ttl
+        ]
+        self._entries[key] = entries
+        return entries
+
+    def lookup(self, collection: str, is_strict: bool, embedding: List[float], version: int) -> Optional[Dict]:
+        with self._lock:
+            entries = self._valid_entries((collection, is_strict), version)
+            if not entries:
+                self.misses += 1
+                return None
+            matrix = np.array([e["embedding"] for e in entries], dtype=np.float32)
+            sims = matrix @ np.asarray(embedding, dtype=np.float32)
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry = entries[best]
+            entry["last_hit"] = time.time()
+            return {**entry, "similarity": float(sims[best])}
+
+    def store(self, collection: str, is_strict: bool, embedding: List[float], version: int,
+              question: str, answer: str, context: List[Document]):
+        key = (collection, is_strict)
+        with self._lock:
+            entries = self._valid_entries(key, version)
+            entries.append({
+                "embedding": embedding,
+                "question": question,
+                "answer": answer,
+                "context": [Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in context],
+                "version": version,
+                "created_at": time.time(),
+                "last_hit": 0.0,
+            })
+            if len(entries) > self.max_entries:
+                # 가장 오래 사용되지 않은 항목부터 제거
+                entries.sort(key=lambda e: max(e["created_at"], e["last_hit"]))
+                del entries[:len(entries) - self.max_entries]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": sum(len(v) for v in self._entries.values()),
+            }
+
+# 프로세스 전역 (Streamlit 세션 간 공유)
+answer_cache = SemanticAnswerCache()
+
+class CachedRagChain:
+    """
+    get_rag_chain 체인을 감싸는 답변 캐시 레이어 (출력 형식은 원래 체인과 동일 + 'cached')
+    대화 이력이 있는 후속 질문은 문맥에 따라 의미가 달라지므로 캐시하지 않는다.
+    """
+
+    def __init__(self, chain, stack_name: Union[str, List[str]], is_strict: bool, cache: SemanticAnswerCache = answer_cache):
+        self.chain = chain
+        # 여러 스택을 함께 검색하는 체인은 컬렉션 조합 단위로 캐시
+        self.collections = [get_collection_name(s) for s in ([stack_name] if isinstance(stack_name, str) else stack_name)]
+        self.collection = COLLECTION_SEPARATOR.join(self.collections)
+        self.is_strict = is_strict
+        self.cache = cache
+
+    def _version(self):
+        versions = tuple(get_collection_version(c) for c in self.collections)
+        return versions[0] if len(versions) == 1 else versions
+
+    def invoke(self, inputs: Dict, config=None) -> Dict:
+        if inputs.get("chat_history"):
+            return self.chain.invoke(inputs, config=config)
+
+        question = inputs["input"]
+        version = self._version()
+        embedding = load_embedding_model().embed_query(question)
+
+        hit = self.cache.lookup(self.collection, self.is_strict, embedding, version)
+        if hit is not None:
+            return {**inputs, "context": hit["context"], "answer": hit["answer"], "cached": True}
+
+        response = self.chain.invoke(inputs, config=config)
+        self.cache.store(
+            self.collection, self.is_strict, embedding, version,
+            question, response["answer"], response.get("context") or []
+        )
+        return response
+
+    def stream(self, inputs: Dict, config=None):
+        """invoke와 같은 캐시 정책의 스트리밍 버전 (원래 체인과 같은 청크 형식)"""
+        if inputs.get("chat_history"):
+            yield from self.chain.stream(inputs, config=config)
+            return
+
+        question = inputs["input"]
+        version = self._version()
+        embedding = load_embedding_model().embed_query(question)
+
+        hit = self.cache.lookup(self.collection, self.is_strict, embedding, version)
+        if hit is not None:
+            yield {"context": hit["context"], "cached": True}
+            yield {"answer": hit["answer"]}
+            return
+
+        context, answer_parts = [], []
+        for chunk in self.chain.stream(inputs, config=config):
+            if "context" in chunk:
+                context = chunk["context"]
+            if chunk.get("answer"):
+                answer_parts.append(chunk["answer"])
+            yield chunk
+        self.cache.store(self.collection, self.is_strict, embedding, version, question, "".join(answer_parts), context)
+
+def with_answer_cache(chain, stack_name: Union[str, List[str]], is_strict: bool) -> CachedRagChain:
+    return CachedRagChain(chain, stack_name, is_strict)
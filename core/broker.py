@@ -0,0 +1,138 @@
+# core/broker.py
+"""
+프로세스 내 추론 브로커 (micro-batching)
+여러 세션/워커가 동시에 보내는 작은 추론 요청(질의 임베딩, 리랭크 쌍)을 큐에 모아
+최대 대기 시간 안에 하나의 배치로 묶어 실행한다. 큐가 가득 차면 제출이 대기하다가 실패한다(backpressure).
+"""
+import os
+import time
+import queue
+import threading
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from core.metrics import incr, observe, record_span
+
+INFERENCE_BROKER_ENABLED = os.getenv("CTRLF5_INFERENCE_BROKER", "1") != "0"
+
+MAX_QUEUE = 256          # 대기 요청 수 상한
+SUBMIT_TIMEOUT = 30.0    # 큐가 가득 찼을 때 제출 대기 시간 (초)
+EMBED_QUERY_BATCH_SIZE = 32
+EMBED_QUERY_MAX_WAIT_MS = 5
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+class BrokerOverloaded(RuntimeError):
+    pass
+
+class _Request:
+    __slots__ = ("items", "event", "result", "error", "submitted", "started")
+
+    def __init__(self, items: list):
+        self.items = items
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.submitted = time.perf_counter()
+        self.started = None
+
+class MicroBatcher:
+    """
+    요청(항목 리스트)을 모아 fn(항목 리스트) → 결과 리스트를 한 번에 실행하는 전용 스레드
+    첫 요청이 들어온 뒤 max_wait_ms 동안, 항목 수가 max_batch_size가 될 때까지 다음 요청을 기다린다.
+    """
+
+    def __init__(self, name: str, fn: Callable[[list], list], max_batch_size: int = 32,
+                 max_wait_ms: float = 5, max_queue: int = MAX_QUEUE, submit_timeout: float = SUBMIT_TIMEOUT):
+        self.name = name
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.submit_timeout = submit_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._carry: Optional[_Request] = None  # 이전 배치에 들어가지 못한 요청
+        self._thread = threading.Thread(target=self._loop, name=f"broker-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, items: list) -> list:
+        """항목을 제출하고 결과를 기다림 (호출 스레드에서 지연 시간 기록)"""
+        if not items:
+            return []
+        request = _Request(list(items))
+        observe("ctrlf5_broker_queue_depth", self._queue.qsize(), buckets=QUEUE_DEPTH_BUCKETS, broker=self.name)
+        try:
+            self._queue.put(request, timeout=self.submit_timeout)
+        except queue.Full:
+            incr("ctrlf5_broker_rejected_total", broker=self.name)
+            raise BrokerOverloaded(f"추론 요청이 많아 처리하지 못했습니다 ({self.name}). 잠시 후 다시 시도해주세요.")
+        request.event.wait()
+
+        done = time.perf_counter()
+        wait = (request.started or done) - request.submitted
+        observe("ctrlf5_broker_wait_seconds", wait, broker=self.name)
+        observe("ctrlf5_broker_latency_seconds", done - request.submitted, broker=self.name)
+        record_span(f"{self.name}_queue_wait", wait)
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self) -> List[_Request]:
+        first, self._carry = self._carry or self._queue.get(), None
+        batch, size = [first], len(first.items)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if size + len(request.items) > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for request in batch:
+                request.started = started
+            items = [item for request in batch for item in request.items]
+            observe("ctrlf5_broker_batch_size", len(items), buckets=BATCH_SIZE_BUCKETS, broker=self.name)
+            try:
+                results = self.fn(items)
+                offset = 0
+                for request in batch:
+                    request.result = results[offset:offset + len(request.items)]
+                    offset += len(request.items)
+            except BaseException as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.event.set()
+            incr("ctrlf5_broker_batches_total", broker=self.name)
+            incr("ctrlf5_broker_requests_total", len(batch), broker=self.name)
+
+class BatchedQueryEmbeddings(Embeddings):
+    """
+    질의 임베딩을 브로커로 모아 배치 실행 (문서 임베딩은 수집 파이프라인이 이미 배치로 보내므로 그대로 전달)
+    bge-m3는 질의/문서에 별도 instruction이 없어 embed_query == embed_documents([query])[0]
+    """
+
+    def __init__(self, underlying: Embeddings, max_batch_size: int = EMBED_QUERY_BATCH_SIZE,
+                 max_wait_ms: float = EMBED_QUERY_MAX_WAIT_MS):
+        self.underlying = underlying
+        self.batcher = MicroBatcher("embed_query", underlying.embed_documents, max_batch_size, max_wait_ms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit([text])[0]
@@ -0,0 +1,179 @@
+# core/cli.py
+"""
+Streamlit 없이 RAG 엔진 실행
+
+    python -m core.cli ask --stack LangChain --input questions.jsonl --output answers.jsonl --workers 4
+    python -m core.cli migrate --stack LangChain --dims 256 --dtype int8   (--full: float32 전체 차원으로 되돌리기)
+    python -m core.cli export --stack LangChain --output langchain.ctrlf5snap
+    python -m core.cli import langchain.ctrlf5snap   (--stack: 다른 스택 이름으로 가져오기)
+
+입력 JSONL: {"question": "...", "id": (선택), "chat_history": [{"role": "user"|"assistant", "content": "..."}] (선택)}
+출력 JSONL: 질문별 answer, sources(source/score/content), timings(단계별 초), context(컨텍스트 토큰 / 절감 토큰), latency
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from dotenv import load_dotenv
+
+def _answer_one(item: Dict, args) -> Dict:
+    from core.engine import get_cached_rag_chain
+    from core.metrics import trace
+    from core.extract import source_link
+    from core.history import to_messages
+
+    result = {"id": item.get("id"), "question": item["question"]}
+    start = time.perf_counter()
+    try:
+        # 모든 워커가 같은 체인(= 같은 임베딩/리랭커/LLM 클라이언트)을 공유
+        rag_chain = get_cached_rag_chain(args.stack, is_strict=args.strict, relevance_threshold=args.threshold, top_k=args.top_k)
+        with trace() as answer_trace:
+            response = rag_chain.invoke({"input": item["question"], "chat_history": to_messages(item.get("chat_history"))})
+        result["answer"] = response["answer"]
+        result["sources"] = [
+            {
+                "source": source_link(doc.metadata, "알 수 없음"),
+                "score": doc.metadata.get("relevance_score"),
+                "stack": doc.metadata.get("stack"),
+                "content": doc.page_content,
+            }
+            for doc in response.get("context") or []
+        ]
+        result["timings"] = answer_trace.breakdown()
+        result["context"] = dict(answer_trace.stats)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["latency"] = time.perf_counter() - start
+    return result
+
+def cmd_ask(args) -> int:
+    with open(args.input, "r", encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failed = 0
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            # 입력 순서대로 기록
+            for i, result in enumerate(pool.map(lambda item: _answer_one(item, args), items), start=1):
+                if "error" in result:
+                    failed += 1
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                print(f"[{i}/{len(items)}] {result['latency']:.2f}s {'❌ ' + result['error'] if 'error' in result else '✅'}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"완료: {len(items)}건, 실패 {failed}건, {time.perf_counter() - start:.1f}초", file=sys.stderr)
+    return 1 if failed else 0
+
+def cmd_migrate(args) -> int:
+    from core.compact import make_storage
+    from core.database import load_config, migrate_collection
+
+    stacks = list(load_config()) if args.all else args.stack
+    storage = None if args.full else make_storage(dims=args.dims or None, dtype=args.dtype)
+
+    failed = 0
+    for stack in stacks:
+        start = time.perf_counter()
+        try:
+            result = migrate_collection(stack, storage)
+        except Exception as e:
+            failed += 1
+            print(f"❌ {stack}: {type(e).__name__}: {e}", file=sys.stderr)
+            continue
+        before, after = result["before"], result["after"]
+        print(
+            f"✅ {stack}: {before['mode']}/{before['dtype']} {before['index_dims']}d → "
+            f"{after['mode']}/{after['dtype']} {after['index_dims']}d, {after['chunks']} chunks, "
+            f"index vectors {before['index_vector_bytes'] / 1e6:.1f}MB → {after['index_vector_bytes'] / 1e6:.1f}MB "
+            f"(+ sidecar {after['sidecar_bytes'] / 1e6:.1f}MB on disk), {time.perf_counter() - start:.1f}s",
+            file=sys.stderr,
+        )
+    return 1 if failed else 0
+
+def cmd_export(args) -> int:
+    from core.snapshot import export_snapshot, default_snapshot_path
+
+    if args.output and len(args.stack) > 1:
+        print("❌ --output은 스택 하나만 내보낼 때 사용할 수 있습니다 (여러 스택은 --output-dir).", file=sys.stderr)
+        return 1
+
+    failed = 0
+    for stack in args.stack:
+        start = time.perf_counter()
+        output = args.output or os.path.join(args.output_dir, default_snapshot_path(stack))
+        try:
+            manifest = export_snapshot(stack, output)
+        except Exception as e:
+            failed += 1
+            print(f"❌ {stack}: {type(e).__name__}: {e}", file=sys.stderr)
+            continue
+        print(
+            f"✅ {stack}: {manifest['path']} ({manifest['chunks']} chunks, {len(manifest['sources'])} sources, "
+            f"{manifest['embedding']['model']}, {os.path.getsize(manifest['path']) / 1e6:.1f}MB), {time.perf_counter() - start:.1f}s",
+            file=sys.stderr,
+        )
+    return 1 if failed else 0
+
+def cmd_import(args) -> int:
+    from core.snapshot import import_snapshot
+
+    start = time.perf_counter()
+    try:
+        result = import_snapshot(args.path, args.stack)
+    except Exception as e:
+        print(f"❌ {args.path}: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    print(f"✅ {result['stack']}: {result['chunks']} chunks → {result['collection']}, {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m core.cli", description="Ctrl + F5 headless CLI")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ask = sub.add_parser("ask", help="JSONL 질문 목록 일괄 답변")
+    ask.add_argument("--stack", required=True, nargs="+", help="stacks_config.json의 스택 이름 (여러 개면 동시 검색)")
+    ask.add_argument("--input", required=True, help="질문 JSONL 경로")
+    ask.add_argument("--output", help="결과 JSONL 경로 (기본: stdout)")
+    ask.add_argument("--workers", type=int, default=4)
+    ask.add_argument("--top-k", type=int, default=5)
+    ask.add_argument("--threshold", type=float, default=0.5)
+    ask.add_argument("--no-strict", dest="strict", action="store_false", help="엄격 모드 끄기")
+    ask.set_defaults(func=cmd_ask)
+
+    migrate = sub.add_parser("migrate", help="기존 컬렉션을 컴팩트(양자화/차원 축소) 저장 방식으로 변환")
+    target = migrate.add_mutually_exclusive_group(required=True)
+    target.add_argument("--stack", nargs="+", help="변환할 스택 이름")
+    target.add_argument("--all", action="store_true", help="stacks_config.json의 모든 스택")
+    migrate.add_argument("--dims", type=int, default=256, help="HNSW 인덱스에 남길 차원 수 (0: 축소 없음)")
+    migrate.add_argument("--dtype", choices=["int8", "float16", "float32"], default="int8", help="재채점용 전체 차원 벡터 형식")
+    migrate.add_argument("--full", action="store_true", help="float32 전체 차원(기본 저장 방식)으로 되돌리기")
+    migrate.set_defaults(func=cmd_migrate)
+
+    export = sub.add_parser("export", help="스택 인덱스를 스냅샷 파일로 내보내기 (다른 노드에서 import)")
+    export.add_argument("--stack", required=True, nargs="+", help="내보낼 스택 이름")
+    export.add_argument("--output", help="스냅샷 경로 (스택 하나일 때, 기본: <컬렉션>-v<버전>.ctrlf5snap)")
+    export.add_argument("--output-dir", default="", help="스냅샷을 저장할 디렉터리")
+    export.set_defaults(func=cmd_export)
+
+    imp = sub.add_parser("import", help="스냅샷 가져오기 (임베딩 계산 없음, 임베딩 모델이 다르면 거부)")
+    imp.add_argument("path", help="스냅샷 파일 경로")
+    imp.add_argument("--stack", help="가져올 스택 이름 (기본: 스냅샷의 스택)")
+    imp.set_defaults(func=cmd_import)
+    return parser
+
+def main(argv=None) -> int:
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
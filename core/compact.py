@@ -0,0 +1,187 @@
+# core/compact.py
+"""
+컴팩트 저장 모드 (컬렉션 단위 선택)
+- Chroma(HNSW 인덱스, 메모리 상주)에는 앞쪽 dims 차원만 잘라 재정규화한 벡터를 저장
+- 전체 차원 벡터는 int8/float16으로 양자화해 컬렉션별 SQLite 파일(디스크)에 저장
+- 검색은 축소 벡터로 후보를 넉넉히 뽑은 뒤, 후보만 전체 차원 벡터로 다시 채점 (MMR도 전체 차원 벡터로 선택)
+"""
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+COMPACT_DIMS = 256
+COMPACT_DTYPE = "int8"
+DTYPES = ("int8", "float16", "float32")
+# 축소 벡터 검색에서 뽑을 후보 수 = k × RESCORE_FACTOR
+RESCORE_FACTOR = 4
+# MMR (langchain max_marginal_relevance_search 기본값과 동일: 유사도 상위 fetch_k개 중 k개 선택)
+MMR_FETCH_K = 20
+MMR_LAMBDA = 0.5
+SIDECAR_DIR = "vectors"
+
+# SQLite 변수 개수 제한 대비
+_LOOKUP_BATCH = 500
+
+def make_storage(dims: Optional[int] = COMPACT_DIMS, dtype: str = COMPACT_DTYPE) -> Dict:
+    if dtype not in DTYPES:
+        raise ValueError(f"지원하지 않는 dtype: {dtype} ({', '.join(DTYPES)})")
+    return {"mode": "compact", "dims": dims, "dtype": dtype}
+
+def truncate(vectors, dims: Optional[int]) -> np.ndarray:
+    """앞쪽 dims 차원만 남기고 L2 재정규화 (dims=None이면 정규화만)"""
+    arr = np.asarray(vectors, dtype=np.float32)
+    if dims:
+        arr = arr[..., :dims]
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    return arr / np.maximum(norms, 1e-12)
+
+def quantize(vector: np.ndarray, dtype: str) -> bytes:
+    if dtype == "int8":
+        # 벡터별 scale (float32) + int8 값
+        scale = float(np.max(np.abs(vector))) / 127 or 1.0
+        return np.float32(scale).tobytes() + np.round(vector / scale).astype(np.int8).tobytes()
+    return np.asarray(vector, dtype=dtype).tobytes()
+
+def dequantize(blob: bytes, dtype: str) -> np.ndarray:
+    if dtype == "int8":
+        scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+    return np.frombuffer(blob, dtype=dtype).astype(np.float32)
+
+class TruncatedEmbeddings(Embeddings):
+    """Chroma에 넘기는 임베딩 함수 (전체 차원 임베딩 → 앞쪽 dims 차원)"""
+
+    def __init__(self, underlying: Embeddings, dims: Optional[int]):
+        self.underlying = underlying
+        self.dims = dims
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return truncate(self.underlying.embed_documents(texts), self.dims).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return truncate(self.underlying.embed_query(text), self.dims).tolist()
+
+class VectorSidecar:
+    """컬렉션별 전체 차원 양자화 벡터 (재채점 후보만 읽으므로 메모리에 올리지 않음)"""
+
+    def __init__(self, path: str, dtype: str):
+        self.path = path
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (id TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def put(self, ids: List[str], vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = [(i, quantize(v, self.dtype)) for i, v in zip(ids, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def get(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(ids), _LOOKUP_BATCH):
+                batch = ids[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT id, vector FROM vectors WHERE id IN ({placeholders})", batch).fetchall()
+                for chunk_id, blob in rows:
+                    found[chunk_id] = dequantize(blob, self.dtype)
+        return found
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM vectors WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM vectors").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_sidecars: Dict[str, VectorSidecar] = {}
+_sidecars_lock = threading.Lock()
+
+def sidecar_path(db_path: str, physical: str) -> str:
+    return os.path.join(db_path, SIDECAR_DIR, f"{physical}.sqlite")
+
+def get_sidecar(db_path: str, physical: str, dtype: str) -> VectorSidecar:
+    """컬렉션 사이드카 (프로세스 안에서 연결 재사용)"""
+    path = sidecar_path(db_path, physical)
+    with _sidecars_lock:
+        sidecar = _sidecars.get(path)
+        if sidecar is None:
+            sidecar = _sidecars[path] = VectorSidecar(path, dtype)
+        return sidecar
+
+def drop_sidecar(db_path: str, physical: str):
+    path = sidecar_path(db_path, physical)
+    with _sidecars_lock:
+        sidecar = _sidecars.pop(path, None)
+    if sidecar is not None:
+        sidecar.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def _score_candidates(query_vector: np.ndarray, docs: List[Document], sidecar: VectorSidecar):
+    """전체 차원 코사인 유사도순 [(점수, 문서, 벡터)]와 사이드카에 없는 후보 목록"""
+    vectors = sidecar.get([d.id for d in docs if d.id])
+    query = truncate(query_vector, None)
+    scored, missing = [], []
+    for doc in docs:
+        vector = vectors.get(doc.id)
+        if vector is None:
+            missing.append(doc)
+        else:
+            vector = truncate(vector, None)
+            scored.append((float(np.dot(query, vector)), doc, vector))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored, missing
+
+def rescore(query_vector: np.ndarray, docs: List[Document], sidecar: VectorSidecar, k: int) -> List[Document]:
+    """후보를 전체 차원 벡터와의 코사인 유사도로 재정렬 (사이드카에 없는 후보는 원래 순서대로 뒤에)"""
+    scored, missing = _score_candidates(query_vector, docs, sidecar)
+    return ([doc for _, doc, _ in scored] + missing)[:k]
+
+def mmr_rescore(query_vector: np.ndarray, docs: List[Document], sidecar: VectorSidecar, k: int,
+                fetch_k: int = MMR_FETCH_K, lambda_mult: float = MMR_LAMBDA) -> List[Document]:
+    """전체 차원 유사도 상위 fetch_k개 중 MMR로 k개 선택 (float32 컬렉션의 MMR 검색과 같은 기준)"""
+    scored, missing = _score_candidates(query_vector, docs, sidecar)
+    pool = scored[:max(fetch_k, k)]
+    if not pool:
+        return missing[:k]
+    relevance = np.array([score for score, _, _ in pool])
+    vectors = np.stack([vector for _, _, vector in pool])
+    similarity = vectors @ vectors.T
+    selected = [0]
+    while len(selected) < min(k, len(pool)):
+        redundancy = similarity[:, selected].max(axis=1)
+        mmr = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        mmr[selected] = -np.inf
+        selected.append(int(np.argmax(mmr)))
+    return ([pool[i][1] for i in selected] + missing)[:k]
+
+def compact_vector_search(vectorstore, storage: Dict, sidecar: VectorSidecar, query: str, k: int,
+                          search_type: str = "mmr") -> List[Document]:
+    """
+    축소 벡터로 유사도 후보 k × RESCORE_FACTOR개 검색 → 전체 차원 벡터로 재채점해 k개 반환
+    MMR은 축소 벡터가 아닌 전체 차원 벡터로 다양성을 계산해야 하므로 후보는 유사도 검색으로만 뽑는다.
+    """
+    full = np.asarray(vectorstore.embeddings.underlying.embed_query(query), dtype=np.float32)
+    short = truncate(full, storage["dims"]).tolist()
+    candidates = vectorstore.similarity_search_by_vector(short, k=k * RESCORE_FACTOR)
+    if search_type == "mmr":
+        return mmr_rescore(full, candidates, sidecar, k)
+    return rescore(full, candidates, sidecar, k)
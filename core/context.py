@@ -0,0 +1,155 @@
+# core/context.py
+"""
+QA 프롬프트에 넣을 컨텍스트 조립
+중복/유사 청크 제거 → 같은 페이지의 인접 청크 병합(겹치는 부분 한 번만) → 관련도 순으로 토큰 예산 안에서 채우기
+"""
+import re
+import time
+import hashlib
+import threading
+from typing import List, Dict, Optional
+
+from langchain_core.documents import Document
+
+from core import database
+from core.metrics import record_span, record_stat
+
+# 프롬프트에 넣을 컨텍스트 토큰 상한 (None이면 예산 없이 중복 제거/병합만)
+CONTEXT_TOKEN_BUDGET = 3000
+# 단어 shingle Jaccard 유사도가 이 값 이상이면 같은 청크로 간주
+NEAR_DUPLICATE_THRESHOLD = 0.9
+SHINGLE_SIZE = 3
+# create_stuff_documents_chain의 문서 구분자
+DOCUMENT_SEPARATOR = "\n\n"
+TOKENIZER_ENCODING = "o200k_base"
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+def count_tokens(text: str) -> int:
+    """토큰 수 (tiktoken이 없거나 인코딩을 받을 수 없으면 글자 수 기반 근사)"""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception as e:
+                    print(f"⚠️ tiktoken 사용 불가, 근사치 사용: {e}")
+                    _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return max(1, len(text) // 3)
+
+def _score(doc: Document) -> float:
+    score = doc.metadata.get("relevance_score", doc.metadata.get("score"))
+    return score if score is not None else 0.0
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def remove_duplicates(docs: List[Document], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[Document]:
+    """완전 중복 / 거의 같은 청크 제거 (입력 순서 = 관련도 순, 앞의 것을 남김)"""
+    kept, kept_shingles, seen = [], [], set()
+    for doc in docs:
+        digest = hashlib.sha256(doc.page_content.strip().encode("utf-8")).hexdigest()
+        if digest in seen:
+            continue
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / (len(shingles | other) or 1) >= threshold for other in kept_shingles):
+            continue
+        seen.add(digest)
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+def _join_overlapping(left: str, right: str, max_overlap: Optional[int] = None) -> str:
+    """앞 청크의 끝과 뒤 청크의 시작이 겹치면 겹치는 부분을 한 번만 남기고 연결"""
+    max_overlap = max_overlap or database.CHUNK_OVERLAP * 2
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+def merge_adjacent(docs: List[Document]) -> List[Document]:
+    """
+    같은 source에서 chunk_index가 연속인 청크를 하나의 구간으로 병합
+    구간의 점수는 구성 청크 중 최고 점수, 순서는 가장 관련도 높은 청크 기준
+    """
+    groups: Dict[str, List[Document]] = {}
+    singles = []
+    for doc in docs:
+        if doc.metadata.get("chunk_index") is None:
+            singles.append(doc)
+        else:
+            groups.setdefault(doc.metadata.get("source", ""), []).append(doc)
+
+    merged = list(singles)
+    for members in groups.values():
+        members.sort(key=lambda d: d.metadata["chunk_index"])
+        run = [members[0]]
+        for doc in members[1:]:
+            if doc.metadata["chunk_index"] == run[-1].metadata["chunk_index"] + 1:
+                run.append(doc)
+                continue
+            merged.append(_merge_run(run))
+            run = [doc]
+        merged.append(_merge_run(run))
+
+    merged.sort(key=_score, reverse=True)
+    return merged
+
+def _merge_run(run: List[Document]) -> Document:
+    if len(run) == 1:
+        return run[0]
+    text = run[0].page_content
+    for doc in run[1:]:
+        text = _join_overlapping(text, doc.page_content)
+    best = max(run, key=_score)
+    metadata = {
+        **best.metadata,
+        "relevance_score": _score(best),
+        "chunk_index": run[0].metadata["chunk_index"],
+        "chunk_index_end": run[-1].metadata["chunk_index"],
+        "merged_chunks": len(run),
+    }
+    return Document(page_content=text, metadata=metadata)
+
+def pack_by_budget(docs: List[Document], token_budget: Optional[int]) -> List[Document]:
+    """관련도 순으로 예산 안에 들어가는 문서만 채움 (가장 관련도 높은 문서는 잘라서라도 포함)"""
+    if token_budget is None:
+        return docs
+    packed, used = [], 0
+    separator = count_tokens(DOCUMENT_SEPARATOR)
+    for doc in docs:
+        tokens = count_tokens(doc.page_content) + (separator if packed else 0)
+        if used + tokens <= token_budget:
+            packed.append(doc)
+            used += tokens
+        elif not packed:
+            # 첫 문서가 예산을 넘는 경우 글자 비율로 잘라서 포함
+            ratio = token_budget / tokens
+            packed.append(Document(page_content=doc.page_content[:int(len(doc.page_content) * ratio)], metadata=dict(doc.metadata)))
+            used = token_budget
+    return packed
+
+def _context_tokens(docs: List[Document]) -> int:
+    return count_tokens(DOCUMENT_SEPARATOR.join(d.page_content for d in docs)) if docs else 0
+
+def assemble_context(docs: List[Document], token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET) -> List[Document]:
+    """필터링된 검색 결과를 프롬프트용 컨텍스트로 조립하고 절약한 토큰 수를 기록"""
+    if not docs:
+        return []
+    start = time.perf_counter()
+    packed = pack_by_budget(merge_adjacent(remove_duplicates(docs)), token_budget)
+    record_span("context_packing", time.perf_counter() - start)
+
+    tokens_in = _context_tokens(docs)
+    tokens_out = _context_tokens(packed)
+    record_stat("context_tokens", tokens_out)
+    record_stat("context_tokens_saved", max(0, tokens_in - tokens_out))
+    return packed
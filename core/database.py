@@ -1,18 +1,43 @@
 # core/database.py
 import os
 import json
-import bs4
-from typing import List, Optional, Dict
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter, Language
-from langchain_chroma import Chroma
+import time
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import List, Optional, Dict, Tuple, TYPE_CHECKING
 from langchain_core.documents import Document
 
+# chromadb / 텍스트 분할기 / HTML 추출기는 사용 시점에 import (앱 첫 화면 렌더링 지연 방지)
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
 # 캐시된 모델 로더 사용
 from core.model_loader import load_embedding_model
+from core.http_cache import HTTP_HEADERS
+from core.metrics import span, incr
 
-DB_PATH = "./chroma_db_expert"
+DB_PATH = os.getenv("CTRLF5_DB_PATH", "./chroma_db_expert")
 CONFIG_PATH = "stacks_config.json"
+VERSION_PATH = os.path.join(DB_PATH, "collection_versions.json")
+ALIAS_PATH = os.path.join(DB_PATH, "collection_aliases.json")
+# 실제 컬렉션별 저장 방식 (없으면 float32 전체 차원 = 기존 방식, 있으면 core.compact 컴팩트 모드)
+STORAGE_PATH = os.path.join(DB_PATH, "collection_storage.json")
+
+# 스테이징 컬렉션 이름 표식 / 교체된 이전 컬렉션 삭제 유예 시간 (진행 중인 질의 보호)
+STAGING_MARKER = "__build_"
+RETIRE_GRACE_SECONDS = 60
+
+# 청크 사이즈 최적화 (800 / 150)
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 150
+
+_version_lock = threading.Lock()
+_alias_lock = threading.Lock()
+_storage_lock = threading.Lock()
+_INHERIT = object()
 
 def save_config(config: Dict):
     with open(CONFIG_PATH, "w", encoding="utf-8") as f:
@@ -24,29 +49,188 @@ def load_config() -> Dict:
             return json.load(f)
     return {"LangChain": [], "Spring Boot": [], "React": []}
 
-def load_vectorstore(stack_name: str) -> Chroma:
-    collection = stack_name.replace(" ", "_").lower()
+def get_collection_name(stack_name: str) -> str:
+    return stack_name.replace(" ", "_").lower()
+
+def _read_json(path: str) -> Dict:
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    return {}
+
+def _write_json_atomic(path: str, data: Dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+def get_collection_version(collection: str) -> int:
+    """컬렉션 버전 조회 (재구축될 때마다 증가, 체인 캐시 무효화 기준)"""
+    return _read_json(VERSION_PATH).get(collection, 0)
+
+def bump_collection_version(collection: str) -> int:
+    """컬렉션 버전 증가 (다른 프로세스에서도 보이도록 파일에 기록)"""
+    with _version_lock:
+        versions = _read_json(VERSION_PATH)
+        versions[collection] = versions.get(collection, 0) + 1
+        _write_json_atomic(VERSION_PATH, versions)
+        return versions[collection]
+
+# --- 컬렉션 별칭: 스택(논리 이름) → 실제 Chroma 컬렉션 ---
+def get_physical_collection(collection: str) -> str:
+    """현재 활성 컬렉션 이름 (별칭이 없으면 논리 이름 그대로 = 기존 방식)"""
+    entry = _read_json(ALIAS_PATH).get(collection)
+    return entry["physical"] if entry else collection
+
+def get_collection_storage(physical: str) -> Optional[Dict]:
+    """컴팩트 저장 설정 ({"mode": "compact", "dims", "dtype"}) 또는 None (float32 전체 차원)"""
+    return _read_json(STORAGE_PATH).get(physical)
+
+def set_collection_storage(physical: str, storage: Optional[Dict]):
+    with _storage_lock:
+        config = _read_json(STORAGE_PATH)
+        if storage:
+            config[physical] = storage
+        else:
+            config.pop(physical, None)
+        _write_json_atomic(STORAGE_PATH, config)
+
+def get_sidecar(physical: str, storage: Dict):
+    from core.compact import get_sidecar as _get_sidecar
+    return _get_sidecar(DB_PATH, physical, storage["dtype"])
+
+def get_sparse_index(physical: str):
+    from core.sparse import get_index
+    return get_index(DB_PATH, physical)
+
+def ensure_sparse_index(vectorstore: "Chroma", batch_size: int = 500):
+    """
+    컬렉션 역색인 반환 (색인 이전에 만든 컬렉션 등 청크 수가 다르면 한 번 다시 색인해 저장)
+    """
+    physical = vectorstore._collection.name
+    index = get_sparse_index(physical)
+    count = vectorstore._collection.count()
+    if index.count() != count:
+        with span("sparse_rebuild", pipeline="index"):
+            from core.sparse import drop_index
+            drop_index(DB_PATH, physical)
+            index = get_sparse_index(physical)
+            for offset in range(0, count, batch_size):
+                data = vectorstore._collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+                index.upsert(data["ids"], data["documents"], data["metadatas"])
+    return index
+
+def _chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path=DB_PATH)
+
+def open_collection(physical: str) -> "Chroma":
+    from langchain_chroma import Chroma
+    embedding = load_embedding_model()
+    storage = get_collection_storage(physical)
+    if storage:
+        from core.compact import TruncatedEmbeddings
+        embedding = TruncatedEmbeddings(embedding, storage["dims"])
     return Chroma(
         persist_directory=DB_PATH, 
-        embedding_function=load_embedding_model(),
-        collection_name=collection
+        embedding_function=embedding,
+        collection_name=physical
     )
 
-def fetch_url_content(url: str) -> List[Document]:
-    headers = {"User-Agent": "Mozilla/5.0"}
+def load_vectorstore(stack_name: str) -> "Chroma":
+    return open_collection(get_physical_collection(get_collection_name(stack_name)))
+
+def create_staging_collection(stack_name: str, tag: str, storage=_INHERIT) -> "Chroma":
+    """
+    재구축용 스테이징 컬렉션 생성 (성공 시 swap_collection으로 교체)
+    storage를 주지 않으면 현재 활성 컬렉션의 저장 방식을 그대로 사용 (None: float32 전체 차원)
+    """
+    collection = get_collection_name(stack_name)
+    physical = f"{collection[:40]}{STAGING_MARKER}{tag}"
+    if storage is _INHERIT:
+        storage = get_collection_storage(get_physical_collection(collection))
+    set_collection_storage(physical, storage)
+    return open_collection(physical)
+
+def drop_collection(physical: str):
+    """컬렉션과 역색인/사이드카 삭제 (임베딩 모델을 로딩하지 않도록 chromadb 클라이언트로 직접 삭제)"""
     try:
-        loader = WebBaseLoader(
-            web_paths=[url],
-            header_template=headers,
-            bs_kwargs=dict(parse_only=bs4.SoupStrainer(["article", "main", "div", "p"]))
-        )
-        return loader.load()
+        _chroma_client().delete_collection(physical)
     except Exception as e:
-        print(f"❌ Error loading {url}: {e}")
-        return []
+        print(f"⚠️ 컬렉션 삭제 실패 ({physical}): {e}")
+    from core.sparse import drop_index
+    drop_index(DB_PATH, physical)
+    if get_collection_storage(physical):
+        from core.compact import drop_sidecar
+        drop_sidecar(DB_PATH, physical)
+        set_collection_storage(physical, None)
+
+def swap_collection(stack_name: str, physical: str) -> str:
+    """
+    활성 컬렉션을 원자적으로 교체 (별칭 파일 os.replace)
+    이전 컬렉션은 진행 중인 질의를 위해 유예 시간 후 삭제한다.
+    """
+    collection = get_collection_name(stack_name)
+    with _alias_lock:
+        aliases = _read_json(ALIAS_PATH)
+        old = aliases.get(collection, {}).get("physical", collection)
+        aliases[collection] = {**aliases.get(collection, {}), "physical": physical, "swapped_at": time.time()}
+        _write_json_atomic(ALIAS_PATH, aliases)
+    bump_collection_version(collection)
+
+    if old != physical:
+        timer = threading.Timer(RETIRE_GRACE_SECONDS, drop_collection, args=(old,))
+        timer.daemon = True
+        timer.start()
+    return old
+
+def list_collections() -> List[str]:
+    # chromadb 버전에 따라 이름 또는 Collection 객체 반환
+    return [c if isinstance(c, str) else c.name for c in _chroma_client().list_collections()]
 
-def build_vectorstore(docs: List[Document], stack_name: str) -> Optional[Chroma]:
-    if not docs: return None
+def cleanup_orphan_collections(failed_tags: set, succeeded_tags: set, retired_before: float) -> List[str]:
+    """
+    사용하지 않는 컬렉션 중 정리 대상만 삭제 (다른 프로세스가 만들고 있는 스테이징 컬렉션은 건드리지 않음)
+    - 스테이징 태그가 failed_tags에 있는 컬렉션 (중단/실패한 빌드)
+    - 스테이징 태그가 succeeded_tags에 있거나 원래 이름인 이전 컬렉션 (retired_before 전에 교체된 것만, 진행 중인 질의 보호)
+    """
+    aliases = _read_json(ALIAS_PATH)
+    active = {entry["physical"] for entry in aliases.values()}
+    retired = {logical[:40] for logical, entry in aliases.items() if entry.get("swapped_at", 0) < retired_before}
+
+    dropped = []
+    for name in list_collections():
+        if name in active:
+            continue
+        prefix, _, tag = name.partition(STAGING_MARKER)
+        if tag in failed_tags or (prefix[:40] in retired and (tag in succeeded_tags or name in aliases)):
+            drop_collection(name)
+            dropped.append(name)
+    return dropped
+
+def create_http_session(pool_size: int = 8) -> requests.Session:
+    """커넥션 풀을 공유하는 HTTP 세션 생성"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+def parse_html(url: str, html: str) -> Tuple[List[Document], Dict]:
+    """HTML에서 본문 추출 (섹션 단위 Document, 추출 통계)"""
+    from core.extract import extract_page
+    docs, stats = extract_page(url, html)
+    incr("ctrlf5_extract_chars_total", stats["raw_chars"], kind="raw_html")
+    incr("ctrlf5_extract_chars_total", stats["extracted_chars"], kind="extracted")
+    return docs, stats
+
+def get_text_splitter(stack_name: str) -> "RecursiveCharacterTextSplitter":
+    from langchain_text_splitters import RecursiveCharacterTextSplitter, Language
 
     # 언어별 최적화
     lang = Language.PYTHON
@@ -54,18 +238,190 @@ def build_vectorstore(docs: List[Document], stack_name: str) -> Optional[Chroma]
     elif any(x in stack_name for x in ["React", "JS", "Node"]): lang = Language.JS
     elif "Go" in stack_name: lang = Language.GO
     
-    # 청크 사이즈 최적화 (800)
-    text_splitter = RecursiveCharacterTextSplitter.from_language(
-        language=lang, chunk_size=800, chunk_overlap=150
+    return RecursiveCharacterTextSplitter.from_language(
+        language=lang, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
     )
-    splits = text_splitter.split_documents(docs)
-    
-    collection = stack_name.replace(" ", "_").lower()
-    
-    vectorstore = Chroma.from_documents(
-        documents=splits, 
-        embedding=load_embedding_model(), 
-        persist_directory=DB_PATH,
-        collection_name=collection
+
+def assign_chunk_ids(chunks: List[Document]) -> List[Document]:
+    """
+    청크 ID = hash(source URL + content hash). 같은 페이지 안의 완전 중복 청크는 하나만 남긴다.
+    """
+    unique = []
+    seen = set()
+    positions: Dict[str, int] = {}
+    for chunk in chunks:
+        source = chunk.metadata.get("source", "")
+        content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+        chunk_id = hashlib.sha256(f"{source}\n{content_hash}".encode("utf-8")).hexdigest()[:32]
+        if chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+        chunk.id = chunk_id
+        chunk.metadata["content_hash"] = content_hash
+        chunk.metadata["chunk_index"] = positions.get(source, 0)
+        positions[source] = positions.get(source, 0) + 1
+        unique.append(chunk)
+    return unique
+
+def get_parse_key() -> str:
+    """청크를 만든 설정 (추출기 버전 + 청크 크기/겹침). 바뀌면 변경 없는 페이지도 다시 파싱/청킹"""
+    from core.extract import EXTRACTOR_VERSION
+    return f"extract{EXTRACTOR_VERSION}:size{CHUNK_SIZE}:overlap{CHUNK_OVERLAP}"
+
+def get_source_state(vectorstore: "Chroma") -> Tuple[Dict[str, Dict[str, Optional[int]]], Dict[str, set]]:
+    """
+    컬렉션의 source URL별 {청크 ID: chunk_index}와 청크를 만든 (parse_key, body_hash) 집합 조회 (본문/임베딩은 읽지 않음)
+    """
+    index: Dict[str, Dict[str, Optional[int]]] = {}
+    built_from: Dict[str, set] = {}
+    data = vectorstore._collection.get(include=["metadatas"])
+    for chunk_id, meta in zip(data["ids"], data["metadatas"]):
+        meta = meta or {}
+        source = meta.get("source", "")
+        index.setdefault(source, {})[chunk_id] = meta.get("chunk_index")
+        built_from.setdefault(source, set()).add((meta.get("parse_key"), meta.get("body_hash")))
+    return index, built_from
+
+def get_source_index(vectorstore: "Chroma") -> Dict[str, Dict[str, Optional[int]]]:
+    """컬렉션의 source URL별 {청크 ID: chunk_index} 조회"""
+    return get_source_state(vectorstore)[0]
+
+def diff_source_chunks(chunks: List[Document], existing: Dict[str, Optional[int]]):
+    """
+    한 source의 새 청크와 기존 청크를 content hash(= 청크 ID)로 비교
+    같은 ID = 유지, 새 ID = 추가, 사라진 ID = 삭제. 추가/삭제가 함께 있으면 min(추가, 삭제)개를 내용이 바뀐 청크(수정)로 집계
+    반환: (임베딩이 필요한 청크, 삭제할 기존 ID, 통계)
+    """
+    new_ids = {c.id for c in chunks}
+    pending = [c for c in chunks if c.id not in existing]
+    stale_ids = [i for i in existing if i not in new_ids]
+    updated = min(len(pending), len(stale_ids))
+    stats = {
+        "added": len(pending) - updated, "updated": updated, "removed": len(stale_ids) - updated,
+        "unchanged": len(chunks) - len(pending),
+    }
+    return pending, stale_ids, stats
+
+def write_vectors(vectorstore: "Chroma", ids: List[str], documents: List[str], metadatas: List[Optional[Dict]], embeddings,
+                  index_sparse: bool = True):
+    """
+    전체 차원 임베딩과 함께 upsert (index_sparse: 희소 역색인도 함께 갱신, 스냅샷 가져오기는 색인 파일을 따로 복사)
+    컴팩트 컬렉션이면 Chroma에는 축소 벡터, 사이드카에는 양자화한 전체 차원 벡터를 기록
+    """
+    if not ids: return
+    physical = vectorstore._collection.name
+    storage = get_collection_storage(physical)
+    if storage:
+        from core.compact import truncate
+        get_sidecar(physical, storage).put(ids, embeddings)
+        embeddings = truncate(embeddings, storage["dims"]).tolist()
+    vectorstore._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+    if index_sparse:
+        get_sparse_index(physical).upsert(ids, documents, metadatas)
+
+def read_vectors(vectorstore: "Chroma", ids: List[str]) -> Dict:
+    """
+    청크 본문/메타데이터와 전체 차원 임베딩 조회 (저장 방식이 다른 컬렉션 간 복사용)
+    컴팩트 컬렉션은 사이드카의 전체 차원 벡터(역양자화)를 반환
+    """
+    data = vectorstore._collection.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+    physical = vectorstore._collection.name
+    storage = get_collection_storage(physical)
+    if not storage:
+        return {"ids": data["ids"], "documents": data["documents"], "metadatas": data["metadatas"], "embeddings": list(data["embeddings"])}
+
+    full = get_sidecar(physical, storage).get(list(data["ids"]))
+    result = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+    for chunk_id, document, metadata in zip(data["ids"], data["documents"], data["metadatas"]):
+        if chunk_id not in full:
+            print(f"⚠️ 전체 차원 벡터 없음, 건너뜀 ({physical}: {chunk_id})")
+            continue
+        result["ids"].append(chunk_id)
+        result["documents"].append(document)
+        result["metadatas"].append(metadata)
+        result["embeddings"].append(full[chunk_id])
+    return result
+
+def copy_chunks(source: "Chroma", target: "Chroma", ids: List[str], batch_size: int = 256,
+                metadata_updates: Optional[Dict[str, Dict]] = None) -> int:
+    """
+    청크를 임베딩째 복사 (모델 호출 없음, 저장 방식이 달라도 대상 방식으로 변환)
+    metadata_updates: ID별로 덮어쓸 메타데이터 (예: 페이지 안에서 위치가 바뀐 청크의 chunk_index)
+    """
+    metadata_updates = metadata_updates or {}
+    copied = 0
+    for i in range(0, len(ids), batch_size):
+        data = read_vectors(source, ids[i:i + batch_size])
+        metadatas = [
+            {**(metadata or {}), **metadata_updates[chunk_id]} if chunk_id in metadata_updates else metadata
+            for chunk_id, metadata in zip(data["ids"], data["metadatas"])
+        ]
+        write_vectors(target, data["ids"], data["documents"], metadatas, data["embeddings"])
+        copied += len(data["ids"])
+    return copied
+
+def write_chunks(vectorstore: "Chroma", chunks: List[Document], embeddings: List[List[float]]):
+    """미리 계산된 임베딩과 함께 청크를 컬렉션에 upsert (ID는 assign_chunk_ids 기준)"""
+    if not chunks: return
+    write_vectors(
+        vectorstore,
+        ids=[c.id for c in chunks],
+        documents=[c.page_content for c in chunks],
+        metadatas=[c.metadata or None for c in chunks],
+        embeddings=embeddings,
     )
-    return vectorstore
\ No newline at end of file
+
+def delete_chunks(vectorstore: "Chroma", ids: List[str], batch_size: int = 500):
+    physical = vectorstore._collection.name
+    storage = get_collection_storage(physical)
+    for i in range(0, len(ids), batch_size):
+        vectorstore._collection.delete(ids=ids[i:i + batch_size])
+        get_sparse_index(physical).delete(ids[i:i + batch_size])
+        if storage:
+            get_sidecar(physical, storage).delete(ids[i:i + batch_size])
+
+def describe_storage(vectorstore: "Chroma") -> Dict:
+    """컬렉션 저장 방식과 크기 (index_vector_bytes: HNSW에 상주하는 벡터 크기)"""
+    physical = vectorstore._collection.name
+    storage = get_collection_storage(physical)
+    count = vectorstore._collection.count()
+    sample = vectorstore._collection.get(limit=1, include=["embeddings"])["embeddings"]
+    dims = len(sample[0]) if len(sample) else 0
+    return {
+        "collection": physical,
+        "mode": storage["mode"] if storage else "float32",
+        "dtype": storage["dtype"] if storage else "float32",
+        "chunks": count,
+        "index_dims": dims,
+        "index_vector_bytes": count * dims * 4,
+        "sidecar_bytes": get_sidecar(physical, storage).size_bytes() if storage else 0,
+        "sparse_bytes": get_sparse_index(physical).size_bytes(),
+    }
+
+def migrate_collection(stack_name: str, storage: Optional[Dict]) -> Dict:
+    """
+    스택 컬렉션을 다른 저장 방식으로 변환 (storage=None: float32 전체 차원)
+    새 컬렉션에 임베딩을 복사한 뒤 원자적으로 교체하므로 변환 중에도 질의 가능
+    """
+    live = load_vectorstore(stack_name)
+    before = describe_storage(live)
+    ids = live._collection.get(include=[])["ids"]
+    staging = create_staging_collection(stack_name, f"migrate{time.strftime('%Y%m%d%H%M%S')}", storage=storage)
+    try:
+        with span("migrate", pipeline="storage"):
+            copy_chunks(live, staging, list(ids))
+    except BaseException:
+        drop_collection(staging._collection.name)
+        raise
+    after = describe_storage(staging)
+    swap_collection(stack_name, staging._collection.name)
+    return {"before": before, "after": after}
+
+def remove_source(stack_name: str, url: str) -> int:
+    """스택에서 삭제된 URL의 청크 제거"""
+    vectorstore = load_vectorstore(stack_name)
+    ids = list(get_source_index(vectorstore).get(url, {}))
+    if ids:
+        delete_chunks(vectorstore, ids)
+        bump_collection_version(get_collection_name(stack_name))
+    return len(ids)
@@ -0,0 +1,127 @@
+# core/embedding_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import List, Dict
+
+from langchain_core.embeddings import Embeddings
+
+EMBED_CACHE_PATH = os.getenv("CTRLF5_EMBED_CACHE_PATH", "./embedding_cache.sqlite")
+EMBED_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1GB (bge-m3 기준 약 25만 청크)
+
+# SQLite 변수 개수 제한 대비
+_LOOKUP_BATCH = 500
+
+class CachedEmbeddings(Embeddings):
+    """
+    임베딩 결과를 SQLite에 저장하는 래퍼 (키: 모델명, 정규화 여부, 텍스트 해시)
+    스택이 달라도 같은 텍스트면 재사용한다. 용량 초과 시 오래 사용되지 않은 항목부터 삭제.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, normalize: bool,
+                 path: str = EMBED_CACHE_PATH, max_bytes: int = EMBED_CACHE_MAX_BYTES):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.normalize = int(bool(normalize))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, normalize INTEGER NOT NULL, text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (model, normalize, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(hashes), _LOOKUP_BATCH):
+                batch = hashes[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND normalize = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, self.normalize, *batch],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[text_hash] = vector.tolist()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE model = ? AND normalize = ? AND text_hash = ?",
+                        [(now, self.model_name, self.normalize, h) for h, _ in rows],
+                    )
+            self._conn.commit()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        now = time.time()
+        rows = [(self.model_name, self.normalize, h, array("f", v).tobytes(), now) for h, v in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._size += sum(len(r[3]) for r in rows)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """용량 초과 시 최근 사용 순서가 오래된 항목부터 삭제 (상한의 90%까지)"""
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute("SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_access")
+        doomed = []
+        size = self._size
+        for rowid, length in cursor:
+            if size <= target:
+                break
+            doomed.append((rowid,))
+            size -= length
+        self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", doomed)
+        self._conn.commit()
+        self._size = size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self._hash(t) for t in texts]
+        found = self._lookup(list(set(hashes)))
+
+        # 캐시에 없는 텍스트만 (중복 제거 후) 모델 실행
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # 질의는 매번 달라 캐시 효율이 낮으므로 그대로 전달
+        return self.underlying.embed_query(text)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": self._size}
@@ -1,118 +1,432 @@
 # core/engine.py
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Union, List
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManagerForRetrieverRun, AsyncCallbackManagerForRetrieverRun
+from langchain_core.runnables import RunnableLambda
 
 # LangChain Modules
 from langchain_classic.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-from langchain_classic.retrievers import EnsembleRetriever, ContextualCompressionRetriever
-from langchain_community.retrievers import BM25Retriever
-from langchain_classic.retrievers.document_compressors import CrossEncoderReranker
 
 # Internal Modules
 from core.model_loader import load_llm, load_reranker_model
 from core.prompts import get_system_prompt
+from core.rerank import score_documents, sigmoid
+from core.context import assemble_context, CONTEXT_TOKEN_BUDGET
+from core.history import HistoryManager
+from core.database import load_vectorstore, get_collection_name, get_collection_version, get_collection_storage, get_sidecar, ensure_sparse_index
+from core.sparse import SparseRetriever
+from core.metrics import span, record_span, record_stat, observe, incr, SCORE_BUCKETS
 
-def get_rag_chain(vectorstore, tech_stack: str = "General", is_strict: bool = True, relevance_threshold: float = 0.0, top_k: int = 5):
+# RRF 결합 상수: 각 leg의 문서 점수 = weight / (RRF_K + rank)
+RRF_K = 60
+
+# 리랭크 방식: full (모든 후보 채점) | cascade (1차 결과로 후보 축소 + 조기 종료)
+RERANK_MODE = os.getenv("CTRLF5_RERANK_MODE", "full")
+RERANK_MODES = ("full", "cascade")
+# cascade 1차 축소: 결합 상위 top_k개 + 두 leg가 모두 찾은 후보 + 한 leg에서 상위 top_k인 후보
+# + BM25 점수가 BM25 최고점의 이 비율 이상인 후보만 리랭크
+# (RRF 점수는 1/(RRF_K + rank) 꼴이라 관련도 차이를 반영하지 못하므로 leg 원점수/일치 여부로 판단)
+CASCADE_BM25_RATIO = 0.5
+# cascade: 리랭크 점수(sigmoid)가 이 이상인 문서로 top_k를 채우면 나머지 후보 생략
+CASCADE_CONFIDENCE = 0.8
+# cascade: 1차 1위가 리랭크에서도 1위이고 이 점수 이상이면 나머지 후보 생략
+CASCADE_EXACT = 0.98
+
+# Vector / BM25 검색을 동시에 실행하기 위한 공용 스레드 풀
+_LEG_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval-leg")
+
+# 여러 스택 동시 검색용 (각 스택의 leg는 _LEG_EXECUTOR에서 실행, 같은 풀에서 중첩 대기하면 교착될 수 있어 분리)
+_STACK_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="stack-fanout")
+
+def _submit_leg(fn, *args, executor: ThreadPoolExecutor = _LEG_EXECUTOR):
+    # 현재 trace(contextvars)를 작업 스레드로 전파
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+class LLMStageTimer(BaseCallbackHandler):
+    """LLM 호출 시간을 단계 이름으로 기록 (rephrase / generation, 첫 토큰 지연 포함)"""
+    run_inline = True
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._starts = {}
+        self._first_token_seen = set()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        start = self._starts.get(run_id)
+        if start is not None and run_id not in self._first_token_seen:
+            self._first_token_seen.add(run_id)
+            record_span(f"{self.stage}_first_token", time.perf_counter() - start)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        self._first_token_seen.discard(run_id)
+        if start is not None:
+            record_span(self.stage, time.perf_counter() - start)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+        self._first_token_seen.discard(run_id)
+        incr("ctrlf5_llm_errors_total", stage=self.stage)
+
+def reciprocal_rank_fusion(result_lists: list[list[Document]], weights: list[float], k: int = RRF_K) -> list[Document]:
+    """
+    Reciprocal Rank Fusion: score = Σ w / (k + rank). 같은 청크는 하나로 합친다.
+    fusion_ranks: leg별 순위 (1부터, 찾지 못한 leg는 None), 메타데이터는 leg 순서대로 합침 (예: bm25_score 유지)
+    """
+    fused = {}
+    for leg, (docs, weight) in enumerate(zip(result_lists, weights)):
+        for rank, doc in enumerate(docs):
+            key = doc.id or doc.page_content
+            if key not in fused:
+                fused[key] = [doc, 0.0, {}, [None] * len(result_lists)]
+            entry = fused[key]
+            entry[1] += weight / (k + rank + 1)
+            entry[2] = {**doc.metadata, **entry[2]}
+            entry[3][leg] = rank + 1
+
+    results = []
+    for doc, score, metadata, ranks in sorted(fused.values(), key=lambda x: x[1], reverse=True):
+        doc = Document(page_content=doc.page_content, metadata={**metadata, "fusion_score": score, "fusion_ranks": ranks}, id=doc.id)
+        results.append(doc)
+    return results
+
+class HybridRetriever(BaseRetriever):
+    """
+    Vector(MMR) + BM25 하이브리드 리트리버
+    두 검색을 병렬로 실행하고 RRF로 결합한다. (동기: 스레드 풀, 비동기: asyncio.gather)
+    """
+    vectorstore: Any
+    bm25_retriever: Optional[Any] = None
+    fetch_k: int = 20
+    search_type: str = "mmr"
+    weights: list[float] = [0.5, 0.5]
+    storage: Optional[dict] = None  # 컴팩트 저장 컬렉션이면 축소 벡터 검색 후 전체 차원 재채점
+
+    def _vector_search(self, query: str) -> list[Document]:
+        with span("vector_search"):
+            if self.storage:
+                from core.compact import compact_vector_search
+                physical = self.vectorstore._collection.name
+                return compact_vector_search(
+                    self.vectorstore, self.storage, get_sidecar(physical, self.storage),
+                    query, self.fetch_k, self.search_type
+                )
+            if self.search_type == "mmr":
+                return self.vectorstore.max_marginal_relevance_search(query, k=self.fetch_k)
+            return self.vectorstore.similarity_search(query, k=self.fetch_k)
+
+    def _bm25_search(self, query: str) -> list[Document]:
+        with span("bm25"):
+            return self.bm25_retriever.invoke(query)
+
+    def _fuse(self, result_lists: list[list[Document]], weights: list[float]) -> list[Document]:
+        with span("fusion"):
+            return reciprocal_rank_fusion(result_lists, weights)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        if self.bm25_retriever is None:
+            return self._fuse([self._vector_search(query)], [1.0])
+        vector_future = _submit_leg(self._vector_search, query)
+        bm25_future = _submit_leg(self._bm25_search, query)
+        return self._fuse([vector_future.result(), bm25_future.result()], self.weights)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        if self.bm25_retriever is None:
+            return self._fuse([await asyncio.to_thread(self._vector_search, query)], [1.0])
+        vector_docs, bm25_docs = await asyncio.gather(
+            asyncio.to_thread(self._vector_search, query),
+            asyncio.to_thread(self._bm25_search, query),
+        )
+        return self._fuse([vector_docs, bm25_docs], self.weights)
+
+def normalize_stack_scores(stack_name: str, docs: list[Document], key: str = "fusion_score") -> list[Document]:
+    """스택별 1차 검색 점수를 0~1로 min-max 정규화하고 스택 이름을 붙인다 (컬렉션마다 점수 분포가 달라 직접 비교 불가)"""
+    scores = [d.metadata.get(key, 0.0) for d in docs]
+    low, high = (min(scores), max(scores)) if scores else (0.0, 0.0)
+    results = []
+    for doc, score in zip(docs, scores):
+        normalized = (score - low) / (high - low) if high > low else 1.0
+        metadata = {**doc.metadata, "stack": stack_name, "normalized_score": normalized}
+        results.append(Document(page_content=doc.page_content, metadata=metadata, id=doc.id))
+    return results
+
+class MultiStackRetriever(BaseRetriever):
     """
-    RAG 파이프라인 생성 (Ensemble + Rerank + LLM)
+    여러 스택(컬렉션)을 동시에 검색하고 정규화 점수로 합친 후보 fetch_k개를 반환
+    전체 지연 시간은 가장 느린 스택 하나 수준 (동기: 스레드 풀, 비동기: asyncio.gather)
     """
-    # 1. 캐시된 모델 로드
-    llm = load_llm()
-    reranker_model = load_reranker_model()
+    retrievers: dict[str, Any]
+    fetch_k: int = 20
+
+    def _merge(self, results: dict[str, list[Document]]) -> list[Document]:
+        with span("stack_merge"):
+            best = {}
+            for stack_name, docs in results.items():
+                for doc in normalize_stack_scores(stack_name, docs):
+                    # 같은 URL이 여러 스택에 있으면 같은 청크 ID → 점수가 높은 쪽만 유지
+                    key = doc.id or doc.page_content
+                    if key not in best or doc.metadata["normalized_score"] > best[key].metadata["normalized_score"]:
+                        best[key] = doc
+            merged = sorted(best.values(), key=lambda d: d.metadata["normalized_score"], reverse=True)
+            return merged[:self.fetch_k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        futures = {
+            stack_name: _submit_leg(retriever.invoke, query, executor=_STACK_EXECUTOR)
+            for stack_name, retriever in self.retrievers.items()
+        }
+        return self._merge({stack_name: f.result() for stack_name, f in futures.items()})
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        results = await asyncio.gather(*(retriever.ainvoke(query) for retriever in self.retrievers.values()))
+        return self._merge(dict(zip(self.retrievers, results)))
+
+def _rank_scored(docs: list[Document], scores: list[float], top_k: int) -> list[Document]:
+    """raw score를 붙여 정렬 후 상위 top_k 반환 (relevance_score: sigmoid 정규화 점수)"""
+    docs_with_scores = []
+    for doc, score in zip(docs, scores):
+        # 리트리버가 같은 Document 객체를 반환할 수 있으므로 복사 후 점수 기록 (체인이 세션 간 공유됨)
+        doc = Document(page_content=doc.page_content, metadata=dict(doc.metadata), id=doc.id)
+
+        # Sigmoid 적용하여 0~1 사이 확률값으로 변환
+        doc.metadata['relevance_score'] = sigmoid(float(score))
+        # 원본 점수도 저장 (디버깅용)
+        doc.metadata['raw_score'] = float(score)
+        docs_with_scores.append(doc)
     
-    # --- [STEP 1] 1차 검색: Ensemble (Vector + BM25) ---
-    # Top-K보다 조금 더 많이 가져와서 Reranking (보통 2~3배수)
-    fetch_k = max(20, top_k * 3)
-    vector_retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": fetch_k})
-    base_retriever = vector_retriever
+    # Sort by score (descending) + Top-K Slice
+    docs_with_scores.sort(key=lambda x: x.metadata['relevance_score'], reverse=True)
+    final_docs = docs_with_scores[:top_k]
+    
+    if final_docs:
+        observe("ctrlf5_top1_relevance_score", final_docs[0].metadata['relevance_score'], buckets=SCORE_BUCKETS)
+    
+    return final_docs
+
+def rerank_documents(reranker_model, query: str, initial_docs: list[Document], top_k: int) -> list[Document]:
+    """Cross-Encoder 재채점 후 상위 top_k 반환 (모든 후보 채점)"""
+    if not initial_docs:
+        return []
+    
+    # 1. Score Calculation (캐시 + 배치 추론)
+    with span("rerank"):
+        scores = score_documents(reranker_model, query, initial_docs)
+    record_stat("rerank_pairs", len(initial_docs))
+
+    # 2. Attach scores and sort (with Sigmoid Normalization)
+    return _rank_scored(initial_docs, scores, top_k)
+
+def cascade_survivors(initial_docs: list[Document], top_k: int, bm25_ratio: float = CASCADE_BM25_RATIO) -> list[Document]:
+    """
+    리랭크할 후보만 남김 (1차 순위 유지, 최소 top_k개)
+    leg 정보가 없거나 leg가 하나뿐이면 판단 근거가 없으므로 남긴다.
+    """
+    # BM25 점수는 컬렉션마다 분포가 달라 스택별 최고점 기준
+    best_bm25 = {}
+    for doc in initial_docs:
+        score, stack = doc.metadata.get("bm25_score"), doc.metadata.get("stack")
+        if score is not None and score > best_bm25.get(stack, 0.0):
+            best_bm25[stack] = score
+
+    survivors = []
+    for i, doc in enumerate(initial_docs):
+        ranks = doc.metadata.get("fusion_ranks")
+        found = [r for r in ranks or [] if r is not None]
+        bm25 = doc.metadata.get("bm25_score")
+        if (
+            i < top_k or not ranks or len(ranks) < 2
+            or len(found) == len(ranks)                                   # 두 leg가 모두 찾음
+            or min(found) <= top_k                                        # 한 leg의 상위 top_k
+            or (bm25 is not None and bm25 >= best_bm25[doc.metadata.get("stack")] * bm25_ratio)
+        ):
+            survivors.append(doc)
+    return survivors
+
+def cascade_rerank_documents(reranker_model, query: str, initial_docs: list[Document], top_k: int) -> list[Document]:
+    """
+    Cascade 리랭크: 1차 leg 일치/원점수로 후보를 줄인 뒤, 1차 상위 top_k개부터 채점하고 확신이 높으면 나머지는 건너뜀
+    - 조기 종료(confident): 채점한 문서로 top_k를 CASCADE_CONFIDENCE 이상 점수로 채운 경우
+    - 조기 종료(exact): 1차 1위가 리랭크에서도 1위이고 CASCADE_EXACT 이상인 경우 (정확한 API 이름 조회 등)
+    """
+    if not initial_docs:
+        return []
+    survivors = cascade_survivors(initial_docs, top_k)
+    first, rest = survivors[:top_k], survivors[top_k:]
+
+    reason = None
+    with span("rerank"):
+        scores = score_documents(reranker_model, query, first)
+        ranked = sorted((sigmoid(s) for s in scores), reverse=True)
+        if len(ranked) >= top_k and ranked[top_k - 1] >= CASCADE_CONFIDENCE:
+            reason = "confident"
+        elif sigmoid(scores[0]) >= CASCADE_EXACT and sigmoid(scores[0]) == ranked[0]:
+            reason = "exact"
+        if rest and reason is None:
+            scores = scores + score_documents(reranker_model, query, rest)
+        else:
+            rest = []
+
+    scored = first + rest
+    record_stat("rerank_pairs", len(scored))
+    incr("ctrlf5_rerank_cascade_total", exit=reason or "none")
+    return _rank_scored(scored, scores, top_k)
+
+# 체인 레지스트리: (collections, is_strict, top_k, threshold) -> (collection versions, chain)
+# 모듈 전역이므로 Streamlit 세션 간에 공유됨
+_CHAIN_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+_BUILD_LOCKS = {}
+
+def _stack_list(stack_name: Union[str, List[str]]) -> List[str]:
+    return [stack_name] if isinstance(stack_name, str) else list(dict.fromkeys(stack_name))
+
+def get_cached_rag_chain(stack_name: Union[str, List[str]], is_strict: bool = True, relevance_threshold: float = 0.0, top_k: int = 5):
+    """
+    캐시된 RAG 체인 반환 (컬렉션이 재구축되어 버전이 바뀐 경우에만 재생성)
+    stack_name에 스택 목록을 주면 여러 컬렉션을 함께 검색하는 체인을 반환한다.
+    """
+    stacks = _stack_list(stack_name)
+    collections = tuple(get_collection_name(s) for s in stacks)
+    version = tuple(get_collection_version(c) for c in collections)
+    key = (collections, is_strict, top_k, relevance_threshold)
+
+    with _REGISTRY_LOCK:
+        entry = _CHAIN_REGISTRY.get(key)
+        if entry and entry[0] == version:
+            return entry[1]
+        build_lock = _BUILD_LOCKS.setdefault(key, threading.Lock())
+
+    # 같은 키에 대한 동시 빌드 방지 (다른 세션이 먼저 만들었으면 재사용)
+    with build_lock:
+        with _REGISTRY_LOCK:
+            entry = _CHAIN_REGISTRY.get(key)
+            if entry and entry[0] == version:
+                return entry[1]
+
+        if len(stacks) == 1:
+            rag_chain = get_rag_chain(
+                load_vectorstore(stacks[0]), stacks[0],
+                is_strict=is_strict, relevance_threshold=relevance_threshold, top_k=top_k
+            )
+        else:
+            rag_chain = get_multi_stack_rag_chain(
+                stacks, is_strict=is_strict, relevance_threshold=relevance_threshold, top_k=top_k
+            )
+
+        with _REGISTRY_LOCK:
+            # 같은 컬렉션 조합의 이전 버전 체인 정리
+            stale = [k for k, (v, _) in _CHAIN_REGISTRY.items() if k[0] == collections and v != version]
+            for k in stale:
+                del _CHAIN_REGISTRY[k]
+            _CHAIN_REGISTRY[key] = (version, rag_chain)
+        return rag_chain
+
+def build_hybrid_retriever(vectorstore, fetch_k: int, search_type: str = "mmr") -> HybridRetriever:
+    """1차 검색기 생성: Vector + BM25 (BM25는 컬렉션 옆에 저장된 역색인 사용, 문서 전체를 읽지 않음)"""
+    bm25_retriever = None
     
     try:
-        collection_data = vectorstore.get() 
-        texts = collection_data['documents']
-        metadatas = collection_data['metadatas']
-        
-        if texts:
-            docs = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas) if t]
-            if docs:
-                bm25_retriever = BM25Retriever.from_documents(docs)
-                bm25_retriever.k = fetch_k
-                base_retriever = EnsembleRetriever(
-                    retrievers=[vector_retriever, bm25_retriever],
-                    weights=[0.5, 0.5]
-                )
+        index = ensure_sparse_index(vectorstore)
+        if index.count():
+            bm25_retriever = SparseRetriever(index=index, k=fetch_k)
     except Exception as e:
-        print(f"⚠️ BM25 생성 실패: {e}")
+        print(f"⚠️ BM25 색인 로드 실패: {e}")
+
+    return HybridRetriever(
+        vectorstore=vectorstore, bm25_retriever=bm25_retriever, fetch_k=fetch_k, search_type=search_type,
+        storage=get_collection_storage(vectorstore._collection.name)
+    )
+
+def build_qa_chain(llm, tech_stack: str, is_strict: bool):
+    """답변 생성 체인 (context 문서 + 대화 이력 → 답변)"""
+    system_instruction = get_system_prompt(tech_stack, is_strict)
+    
+    qa_prompt = ChatPromptTemplate.from_messages([
+        ("system", system_instruction),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+    ])
+    
+    return create_stuff_documents_chain(llm, qa_prompt)
+
+def get_rag_chain(vectorstore, tech_stack: str = "General", is_strict: bool = True, relevance_threshold: float = 0.0, top_k: int = 5,
+                  llm=None, fetch_k: Optional[int] = None, search_type: str = "mmr", rerank: bool = True,
+                  context_token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET, rerank_mode: str = RERANK_MODE):
+    """
+    RAG 파이프라인 생성 (Hybrid + Rerank + LLM)
+    invoke/stream 외에 ainvoke/astream도 검색 → 리랭크 → 생성 전 구간 비동기로 동작한다.
+    llm / fetch_k / search_type / rerank는 벤치마크 등에서 구성 요소를 바꿔 볼 때 사용.
+    context_token_budget: 프롬프트 컨텍스트 토큰 상한 (None이면 중복 제거/병합만)
+    rerank_mode: full (모든 후보 리랭크) | cascade (1차 점수로 후보 축소 + 조기 종료)
+    """
+    # --- [STEP 1] 1차 검색: Hybrid (Vector + BM25 병렬 실행, RRF 결합) ---
+    # Top-K보다 조금 더 많이 가져와서 Reranking (보통 2~3배수)
+    fetch_k = fetch_k or max(20, top_k * 3)
+    base_retriever = build_hybrid_retriever(vectorstore, fetch_k, search_type=search_type)
+    return build_rag_chain(base_retriever, tech_stack, is_strict, relevance_threshold, top_k,
+                           llm=llm, rerank=rerank, context_token_budget=context_token_budget, rerank_mode=rerank_mode)
+
+def get_multi_stack_rag_chain(stack_names: List[str], is_strict: bool = True, relevance_threshold: float = 0.0, top_k: int = 5,
+                              llm=None, fetch_k: Optional[int] = None, search_type: str = "mmr", rerank: bool = True,
+                              context_token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET, rerank_mode: str = RERANK_MODE):
+    """
+    여러 스택을 함께 검색하는 RAG 파이프라인
+    스택별 Hybrid 검색을 동시에 실행 → 점수 정규화 후 병합 → 한 번의 Rerank → 생성 (출처에 스택 이름 표시)
+    """
+    fetch_k = fetch_k or max(20, top_k * 3)
+    # 스택별 BM25 인덱스 생성도 동시에
+    retrievers = dict(zip(stack_names, _STACK_EXECUTOR.map(
+        lambda s: build_hybrid_retriever(load_vectorstore(s), fetch_k, search_type=search_type), stack_names
+    )))
+    base_retriever = MultiStackRetriever(retrievers=retrievers, fetch_k=fetch_k)
+    return build_rag_chain(base_retriever, " + ".join(stack_names), is_strict, relevance_threshold, top_k,
+                           llm=llm, rerank=rerank, context_token_budget=context_token_budget, rerank_mode=rerank_mode)
+
+def build_rag_chain(base_retriever, tech_stack: str, is_strict: bool, relevance_threshold: float, top_k: int,
+                    llm=None, rerank: bool = True, context_token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET,
+                    rerank_mode: str = RERANK_MODE):
+    """1차 검색기 이후 공통 구간: 이력 정리 → Rerank → 점수 필터 → 컨텍스트 조립 → 질문 재구성 → 답변 생성"""
+    # 캐시된 모델 로드
+    llm = llm or load_llm()
 
     # --- [STEP 2] 2차 검색: Reranker (Manual Implementation) ---
-    try:
-        # User defined Top-K used here
-        compressor = CrossEncoderReranker(model=reranker_model, top_n=top_k)
-        
-        # ContextualCompressionRetriever 대신 수동 실행 (점수 보존 확인용)
-        def manual_rerank_retrieval(query: str):
-            # 1. Base Retrieval
-            initial_docs = base_retriever.invoke(query)
-            
-            if not initial_docs:
-                return []
-            
-            # 2. Score Calculation (Directly using the model)
-            # HuggingFaceCrossEncoder (LangChain wrapper) usually has a 'score' method causing issues or stripping results.
-            # We construct pairs manually.
-            pairs = [[query, doc.page_content] for doc in initial_docs]
-            
-            try:
-                # Try accessing the underlying sentence-transformer model directly if possible
-                # reranker_model is HuggingFaceCrossEncoder
-                # Its logic: scores = model.predict(pairs)
-                scores = reranker_model.model.predict(pairs)
-                
-                # Check if scores are a list of floats or tensor
-                if hasattr(scores, 'tolist'):
-                    scores = scores.tolist()
-            except Exception as e:
-                print(f"⚠️ Direct scoring failed, trying LangChain scoring: {e}")
-                # Fallback to LangChain 'score' method if available
-                scores = reranker_model.score(pairs)
-
-            # 3. Attach scores and sort (with Sigmoid Normalization)
-            import math
-            def sigmoid(x):
-                return 1 / (1 + math.exp(-x))
-
-            docs_with_scores = []
-            for doc, score in zip(initial_docs, scores):
-                # score가 array/tensor일 경우 float로 변환
-                if isinstance(score, list): score = score[0]
-                
-                # Sigmoid 적용하여 0~1 사이 확률값으로 변환
-                normalized_score = sigmoid(float(score))
-                
-                doc.metadata['relevance_score'] = normalized_score
-                # 원본 점수도 저장 (디버깅용)
-                doc.metadata['raw_score'] = float(score)
-                
-                docs_with_scores.append(doc)
-            
-            # 4. Sort by score (descending)
-            docs_with_scores.sort(key=lambda x: x.metadata['relevance_score'], reverse=True)
-            
-            # 5. Top-K Slice
-            final_docs = docs_with_scores[:top_k]
-            
-            # DEBUG
-            if final_docs:
-                print(f"🔎 [DEBUG] Top-1 Score: {final_docs[0].metadata['relevance_score']}")
-            
-            return final_docs
+    # 리랭커 미사용/로드 실패 시 1차 검색 상위 top_k 사용
+    retriever = base_retriever | RunnableLambda(lambda docs: docs[:top_k])
+    if rerank:
+        if rerank_mode not in RERANK_MODES:
+            raise ValueError(f"지원하지 않는 리랭크 방식: {rerank_mode} ({', '.join(RERANK_MODES)})")
+        rerank_fn = cascade_rerank_documents if rerank_mode == "cascade" else rerank_documents
+        try:
+            reranker_model = load_reranker_model()
 
-        from langchain_core.runnables import RunnableLambda
-        retriever = RunnableLambda(manual_rerank_retrieval)
+            # ContextualCompressionRetriever 대신 수동 실행 (점수 보존 확인용)
+            def manual_rerank_retrieval(query: str):
+                return rerank_fn(reranker_model, query, base_retriever.invoke(query), top_k)
 
-    except Exception as e:
-        print(f"⚠️ Reranker 로드 실패: {e}")
-        retriever = base_retriever
+            async def amanual_rerank_retrieval(query: str):
+                # 후보가 모이는 즉시 리랭크 시작 (CPU 작업은 스레드에서 실행해 이벤트 루프를 막지 않음)
+                initial_docs = await base_retriever.ainvoke(query)
+                return await asyncio.to_thread(rerank_fn, reranker_model, query, initial_docs, top_k)
+
+            retriever = RunnableLambda(manual_rerank_retrieval, afunc=amanual_rerank_retrieval)
+
+        except Exception as e:
+            print(f"⚠️ Reranker 로드 실패: {e}")
 
     # --- [STEP 3] Filtering with Threshold ---
     def filter_documents(docs: list[Document]) -> list[Document]:
@@ -120,11 +434,7 @@ def get_rag_chain(vectorstore, tech_stack: str = "General", is_strict: bool = Tr
         if not docs:
             return []
         
-        # DEBUG: 첫 번째 문서의 메타데이터 확인
-        if docs:
-            print(f"🔎 First Doc Metadata keys: {docs[0].metadata.keys()}")
-            print(f"🔎 First Doc Metadata score: {docs[0].metadata.get('relevance_score')}")
-
+        start = time.perf_counter()
         filtered = []
         for doc in docs:
             # metadata 키 확인 (relevance_score 또는 score)
@@ -138,38 +448,38 @@ def get_rag_chain(vectorstore, tech_stack: str = "General", is_strict: bool = Tr
                 # 점수를 metadata에 명시적으로 'relevance_score'로 통일 (UI 표시용)
                 doc.metadata['relevance_score'] = score
                 filtered.append(doc)
-                
+        
+        record_span("threshold_filter", time.perf_counter() - start)
+        incr("ctrlf5_filtered_documents_total", len(docs) - len(filtered))
         return filtered
 
-    from langchain_core.runnables import RunnableLambda
-    filtered_retriever = retriever | RunnableLambda(filter_documents)
+    # --- [STEP 4] 컨텍스트 조립: 중복 제거, 인접 청크 병합, 토큰 예산 ---
+    filtered_retriever = (
+        retriever
+        | RunnableLambda(filter_documents)
+        | RunnableLambda(lambda docs: assemble_context(docs, context_token_budget))
+    )
 
-    # 4. 질문 재구성 (History Aware)
+    # 5. 질문 재구성 (History Aware, 요약 없이 최근 턴만 짧게 전달)
     contextualize_q_system_prompt = (
         "Given a chat history and the latest user question..."
         "(Do NOT answer the question, just reformulate it)"
     )
     contextualize_q_prompt = ChatPromptTemplate.from_messages([
         ("system", contextualize_q_system_prompt),
-        MessagesPlaceholder("chat_history"),
+        MessagesPlaceholder("rephrase_history"),
         ("human", "{input}"),
     ])
     
     # retriever -> filtered_retriever 변경
     history_aware_retriever = create_history_aware_retriever(
-        llm, filtered_retriever, contextualize_q_prompt
+        llm.with_config(callbacks=[LLMStageTimer("rephrase")]), filtered_retriever, contextualize_q_prompt
     )
 
-    # 5. 답변 생성 (QA Chain)
-    system_instruction = get_system_prompt(tech_stack, is_strict)
-    
-    qa_prompt = ChatPromptTemplate.from_messages([
-        ("system", system_instruction),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}"),
-    ])
-    
-    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+    # 6. 답변 생성 (QA Chain)
+    question_answer_chain = build_qa_chain(llm.with_config(callbacks=[LLMStageTimer("generation")]), tech_stack, is_strict)
     rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
-    
-    return rag_chain
\ No newline at end of file
+
+    # 7. 대화 이력 정리: 오래된 턴은 요약 1개로, 재구성/답변 호출에 각각 예산 안의 이력 전달
+    history_manager = HistoryManager(llm)
+    return RunnableLambda(history_manager.prepare) | rag_chain
\ No newline at end of file
@@ -0,0 +1,208 @@
+# core/extract.py
+"""
+문서 사이트(Mintlify, MkDocs, Docusaurus 등) 본문 추출기 (lxml)
+본문 영역 하나만 골라 문서 순서대로 한 번만 훑는다.
+- 네비게이션/사이드바/목차/푸터 등 반복 요소 제거
+- 코드 블록은 언어 정보와 줄바꿈을 유지한 fenced code block으로 변환
+- h1~h3 기준으로 섹션을 나누고 제목/앵커를 metadata로 기록
+"""
+import re
+from typing import List, Dict, Tuple, Optional
+
+import lxml.html
+from langchain_core.documents import Document
+
+# 추출 결과가 달라지는 변경을 하면 올림 (변경 없는 페이지도 다시 파싱/청킹)
+EXTRACTOR_VERSION = 1
+
+# 본문 영역 후보 (앞에서부터 우선, 사이트 전용 → 일반)
+MAIN_XPATHS = [
+    '//*[contains(concat(" ", normalize-space(@class), " "), " theme-doc-markdown ")]',  # Docusaurus
+    '//*[contains(concat(" ", normalize-space(@class), " "), " md-content__inner ")]',   # MkDocs Material
+    '//*[@id="content-area"]',                                                          # Mintlify
+    '//div[@role="main"]',                                                              # MkDocs / Sphinx
+    "//article",
+    "//main",
+    '//*[@role="main"]',
+    "//body",
+]
+MIN_CONTENT_CHARS = 200
+
+# 본문 안에서도 건너뛸 요소
+SKIP_TAGS = {"script", "style", "noscript", "svg", "button", "form", "iframe", "template", "nav", "aside", "footer", "select"}
+SKIP_PATTERN = re.compile(
+    r"(^|[\s_-])(nav|navbar|sidebar|toc|table-of-contents|breadcrumbs?|footer|menu|pagination|pager|"
+    r"edit-?this-?page|feedback|cookie|skip-link|announcement|headerlink|hash-link|copy-button)($|[\s_-])",
+    re.IGNORECASE,
+)
+SKIP_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search"}
+
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "ul", "ol", "li", "dl", "dt", "dd",
+    "table", "thead", "tbody", "tr", "blockquote", "figure", "figcaption", "details", "summary", "hr", "br",
+}
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# 이 수준 이하의 제목에서 섹션(Document)을 나눔
+SECTION_LEVEL = 3
+
+LANGUAGE_PATTERN = re.compile(r"(?:language|lang|highlight-source|highlight)-([\w+#.-]+)")
+_WHITESPACE = re.compile(r"\s+")
+
+def _skip(el) -> bool:
+    if el.tag in SKIP_TAGS:
+        return True
+    if el.get("role") in SKIP_ROLES or el.get("aria-hidden") == "true":
+        return True
+    marker = f"{el.get('class', '')} {el.get('id', '')}"
+    return bool(marker.strip()) and bool(SKIP_PATTERN.search(marker))
+
+def _code_language(pre) -> str:
+    for el in (pre, *pre.iterchildren("code"), pre.getparent()):
+        if el is None:
+            continue
+        match = LANGUAGE_PATTERN.search(el.get("class", "") or "")
+        if match:
+            return match.group(1).lower()
+    return ""
+
+def _code_text(el) -> str:
+    """코드 블록 원문 (<br>과 줄 단위 span의 줄바꿈 유지)"""
+    parts = [el.text or ""]
+    for child in el:
+        if not isinstance(child.tag, str):
+            parts.append(child.tail or "")
+            continue
+        if child.tag == "br":
+            parts.append("\n")
+        elif not _skip(child):
+            parts.append(_code_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+def _heading_anchor(el) -> str:
+    if el.get("id"):
+        return el.get("id")
+    for a in el.iter("a"):
+        if a.get("id"):
+            return a.get("id")
+        href = a.get("href", "")
+        if href.startswith("#") and len(href) > 1:
+            return href[1:]
+    parent = el.getparent()
+    return parent.get("id", "") if parent is not None else ""
+
+class _Walker:
+    """본문 트리를 한 번 순회하며 섹션 단위 텍스트를 만든다"""
+
+    def __init__(self):
+        self.sections: List[Dict] = [{"section": "", "anchor": "", "blocks": []}]
+        self.inline: List[str] = []
+        self.prefix = ""  # 다음 문단 앞에 붙일 목록 기호
+        self.code_blocks = 0
+
+    def flush(self):
+        text = _WHITESPACE.sub(" ", "".join(self.inline)).strip()
+        self.inline = []
+        if text:
+            self.sections[-1]["blocks"].append(self.prefix + text)
+            self.prefix = ""
+
+    def walk(self, el, root: bool = False):
+        if not isinstance(el.tag, str) or (not root and _skip(el)):
+            return
+        tag = el.tag
+
+        if tag in HEADING_TAGS:
+            self.flush()
+            title = _WHITESPACE.sub(" ", "".join(c for c in _visible_text(el))).strip()
+            if not title:
+                return
+            level = HEADING_TAGS[tag]
+            if level <= SECTION_LEVEL:
+                self.sections.append({"section": title, "anchor": _heading_anchor(el), "blocks": []})
+            self.sections[-1]["blocks"].append("#" * level + " " + title)
+            return
+
+        if tag == "pre":
+            self.flush()
+            code = _code_text(el).strip("\n")
+            if code.strip():
+                self.sections[-1]["blocks"].append(f"```{_code_language(el)}\n{code}\n```")
+                self.code_blocks += 1
+            return
+
+        if tag == "code":
+            # 본문 중 인라인 코드
+            self.inline.append(f"`{el.text_content().strip()}`")
+            return
+
+        block = tag in BLOCK_TAGS
+        if block:
+            self.flush()
+        if tag == "li":
+            self.prefix = "- "
+        elif tag in ("td", "th"):
+            self.inline.append(" | ")
+        self.inline.append(el.text or "")
+        for child in el:
+            self.walk(child)
+            self.inline.append(child.tail or "")
+        if block:
+            self.flush()
+
+def _visible_text(el):
+    if el.text:
+        yield el.text
+    for child in el:
+        if isinstance(child.tag, str) and not _skip(child):
+            yield from _visible_text(child)
+        if child.tail:
+            yield child.tail
+
+def _find_main(root):
+    best, best_len = None, -1
+    for xpath in MAIN_XPATHS:
+        for candidate in root.xpath(xpath):
+            length = len(candidate.text_content().strip())
+            if length >= MIN_CONTENT_CHARS:
+                return candidate
+            if length > best_len:
+                best, best_len = candidate, length
+    return best if best is not None else root
+
+def extract_page(url: str, html: str) -> Tuple[List[Document], Dict]:
+    """
+    HTML → 섹션 단위 Document 목록 (metadata: source, title, section, anchor)
+    통계: 원본 HTML 글자 수, 추출한 글자 수, 섹션/코드 블록 수
+    """
+    stats = {"raw_chars": len(html), "extracted_chars": 0, "sections": 0, "code_blocks": 0}
+    if not html.strip():
+        return [], stats
+    # 인코딩 선언이 있는 str은 lxml이 거부하므로 bytes로 전달
+    root = lxml.html.document_fromstring(html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+
+    title_el = root.find(".//title")
+    title = _WHITESPACE.sub(" ", title_el.text_content()).strip() if title_el is not None else ""
+
+    walker = _Walker()
+    walker.walk(_find_main(root), root=True)
+    walker.flush()
+
+    docs = []
+    for section in walker.sections:
+        content = "\n\n".join(section["blocks"]).strip()
+        if not content:
+            continue
+        metadata = {"source": url, "title": title, "section": section["section"], "anchor": section["anchor"]}
+        docs.append(Document(page_content=content, metadata=metadata))
+
+    stats["extracted_chars"] = sum(len(d.page_content) for d in docs)
+    stats["sections"] = len(docs)
+    stats["code_blocks"] = walker.code_blocks
+    return docs, stats
+
+def source_link(metadata: Dict, default: Optional[str] = None) -> str:
+    """출처 표시용 URL (섹션 앵커가 있으면 #anchor 포함)"""
+    source = metadata.get("source", default)
+    anchor = metadata.get("anchor")
+    return f"{source}#{anchor}" if source and anchor else source
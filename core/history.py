@@ -0,0 +1,192 @@
+# core/history.py
+"""
+대화 이력 관리
+- 최근 N턴은 그대로, 그 이전 턴은 누적 요약 1개로 접어서 전달 (토큰 예산 안으로)
+- 질문 재구성(rephrase)에는 요약 없이 최근 턴만, 코드 블록을 뺀 짧은 형태로 전달
+- 요약은 답변 경로를 막지 않도록 백그라운드에서 만들고, 접힌 대화 내용 기준으로 프로세스 전역 캐시
+"""
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
+
+from core.context import count_tokens
+from core.metrics import observe, incr, record_stat
+
+# QA 호출: 최근 턴(질문+답변 1쌍) 수 / 이력 전체 토큰 상한
+HISTORY_KEEP_TURNS = 3
+HISTORY_TOKEN_BUDGET = 1500
+# 질문 재구성 호출: 최근 턴 수 / 토큰 상한 / 메시지당 토큰 상한
+REPHRASE_KEEP_TURNS = 2
+REPHRASE_TOKEN_BUDGET = 400
+REPHRASE_MESSAGE_TOKENS = 120
+# 누적 요약 길이 상한 (토큰)
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_CACHE_SIZE = 1000
+
+SUMMARY_PREFIX = "이전 대화 요약:\n"
+SUMMARY_PROMPT = (
+    "Update the running summary of a developer's conversation with a documentation assistant.\n"
+    "Keep the user's goal, tech stack and versions, error messages, identifiers and decisions already made. "
+    "Drop code bodies and pleasantries. Write in Korean, at most {max_words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{messages}\n\nUpdated summary:"
+)
+
+_CODE_BLOCK = re.compile(r"```.*?(```|$)", re.DOTALL)
+
+# 요약 캐시 (프로세스 전역: 스택/모드가 다른 체인, Streamlit 세션, CLI 요청 간 공유)
+_summaries: "OrderedDict[str, str]" = OrderedDict()
+_pending = set()
+_lock = threading.Lock()
+_SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+
+def _digest(previous: str, message: BaseMessage) -> str:
+    return hashlib.sha256(f"{previous}\x00{message.type}\x00{message.content}".encode("utf-8")).hexdigest()
+
+def _tokens(messages: List[BaseMessage]) -> int:
+    return sum(count_tokens(m.content) for m in messages)
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """앞/뒤를 남기고 가운데를 생략 (붙여넣은 긴 로그/코드 대비)"""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = int(len(text) * max_tokens / tokens) // 2
+    return f"{text[:keep]}\n…(생략)…\n{text[-keep:]}" if keep else ""
+
+def _strip_code(text: str) -> str:
+    return _CODE_BLOCK.sub("[코드 생략]", text)
+
+def _cached(key: str) -> Optional[str]:
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is not None:
+            _summaries.move_to_end(key)
+        return summary
+
+def _store(key: str, summary: str):
+    with _lock:
+        _summaries[key] = summary
+        _summaries.move_to_end(key)
+        while len(_summaries) > SUMMARY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+
+class HistoryManager:
+    """
+    chat_history → (QA용, 질문 재구성용) 이력
+    요약 캐시 키는 접힌 메시지 전체의 누적 해시 (같은 대화 앞부분이면 어느 체인에서든 재사용)
+    """
+
+    def __init__(self, llm=None, keep_turns: int = HISTORY_KEEP_TURNS, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 rephrase_turns: int = REPHRASE_KEEP_TURNS, rephrase_budget: int = REPHRASE_TOKEN_BUDGET):
+        self.llm = llm
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.rephrase_turns = rephrase_turns
+        self.rephrase_budget = rephrase_budget
+
+    # --- 요약 ---
+    def _summarize(self, summary: str, messages: List[BaseMessage]) -> str:
+        lines = "\n".join(
+            f"{'User' if m.type == 'human' else 'Assistant'}: {truncate_text(_strip_code(m.content), 300)}" for m in messages
+        )
+        prompt = SUMMARY_PROMPT.format(max_words=SUMMARY_MAX_TOKENS // 2, summary=summary or "(없음)", messages=lines)
+        start = time.perf_counter()
+        result = self.llm.invoke(prompt)
+        observe("ctrlf5_history_summary_seconds", time.perf_counter() - start)
+        return truncate_text(str(getattr(result, "content", result)).strip(), SUMMARY_MAX_TOKENS)
+
+    def _fold(self, folded: List[BaseMessage], digests: List[str]):
+        """접힌 메시지 요약 생성 (가장 긴 캐시된 앞부분 요약 + 나머지 메시지로 갱신)"""
+        key = digests[-1]
+        try:
+            start, summary = 0, ""
+            for i in range(len(digests) - 1, -1, -1):
+                cached = _cached(digests[i])
+                if cached is not None:
+                    start, summary = i + 1, cached
+                    break
+            _store(key, self._summarize(summary, folded[start:]))
+            incr("ctrlf5_history_summaries_total")
+        except Exception as e:
+            print(f"⚠️ 대화 요약 실패: {e}")
+            incr("ctrlf5_history_summary_errors_total")
+        finally:
+            with _lock:
+                _pending.discard(key)
+
+    def summary_for(self, folded: List[BaseMessage]) -> Optional[str]:
+        """
+        접힌 메시지의 요약. 캐시에 없으면 백그라운드 요약을 예약하고,
+        이번 턴에는 가장 긴 캐시된 앞부분 요약을 사용 (없으면 None)
+        """
+        if not folded:
+            return None
+        digests, previous = [], ""
+        for message in folded:
+            previous = _digest(previous, message)
+            digests.append(previous)
+
+        summary = _cached(digests[-1])
+        if summary is not None:
+            return summary
+        if self.llm is not None:
+            with _lock:
+                schedule = digests[-1] not in _pending
+                _pending.add(digests[-1])
+            if schedule:
+                _SUMMARY_EXECUTOR.submit(self._fold, list(folded), digests)
+        for key in reversed(digests[:-1]):
+            summary = _cached(key)
+            if summary is not None:
+                return summary
+        return None
+
+    # --- 이력 구성 ---
+    def _fit(self, messages: List[BaseMessage], budget: int, fixed: int = 0) -> List[BaseMessage]:
+        """토큰 예산에 맞게 오래된 메시지부터 제외하고, 그래도 넘치면 긴 메시지를 줄임 (마지막 턴은 유지)"""
+        messages = list(messages)
+        while len(messages) > 2 and fixed + _tokens(messages) > budget:
+            messages = messages[2:]
+        over = fixed + _tokens(messages) - budget
+        if over > 0 and messages:
+            per_message = max(50, (budget - fixed) // len(messages))
+            messages = [m.__class__(content=truncate_text(m.content, per_message)) for m in messages]
+        return messages
+
+    def qa_history(self, history: List[BaseMessage]) -> List[BaseMessage]:
+        """요약 1개 + 최근 keep_turns턴 (토큰 예산 이하)"""
+        keep = self.keep_turns * 2
+        recent, folded = history[-keep:], history[:-keep]
+        summary = self.summary_for(folded)
+        prefix = [SystemMessage(content=SUMMARY_PREFIX + summary)] if summary else []
+        return prefix + self._fit(recent, self.token_budget, _tokens(prefix))
+
+    def rephrase_history(self, history: List[BaseMessage]) -> List[BaseMessage]:
+        """질문 재구성용: 최근 rephrase_turns턴, 답변은 코드 블록 제외 후 짧게"""
+        recent = history[-self.rephrase_turns * 2:]
+        slim = [
+            m.__class__(content=truncate_text(_strip_code(m.content) if isinstance(m, AIMessage) else m.content, REPHRASE_MESSAGE_TOKENS))
+            for m in recent
+        ]
+        return self._fit(slim, self.rephrase_budget)
+
+    def prepare(self, inputs: Dict) -> Dict:
+        """체인 입력의 chat_history를 QA용으로 바꾸고 rephrase_history를 추가"""
+        history = inputs.get("chat_history") or []
+        if not history:
+            return {**inputs, "chat_history": [], "rephrase_history": []}
+        qa = self.qa_history(history)
+        tokens_in, tokens_out = _tokens(history), _tokens(qa)
+        record_stat("history_tokens", tokens_out)
+        record_stat("history_tokens_saved", max(0, tokens_in - tokens_out))
+        return {**inputs, "chat_history": qa, "rephrase_history": self.rephrase_history(history)}
+
+def to_messages(history: List[Dict]) -> List[BaseMessage]:
+    """{"role", "content"} 목록 → LangChain 메시지"""
+    return [HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"]) for m in history or []]
@@ -0,0 +1,115 @@
+# core/http_cache.py
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Optional
+
+import requests
+
+CACHE_DIR = os.getenv("CTRLF5_HTTP_CACHE_DIR", "./http_cache")
+HTTP_HEADERS = {"User-Agent": "Mozilla/5.0"}
+HTTP_TIMEOUT = 30
+
+# fetch_cached 결과 상태
+FETCHED = "fetched"            # 200, 새 본문
+NOT_MODIFIED = "not_modified"  # 304 또는 본문 해시 동일 → 파싱/임베딩 생략 가능
+CACHED = "cached"              # 오프라인 모드, 캐시 본문 사용
+
+_write_lock = threading.Lock()
+
+class CacheMiss(Exception):
+    """오프라인 모드에서 캐시에 없는 URL"""
+
+def _paths(url: str, cache_dir: str):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir, f"{key}.json"), os.path.join(cache_dir, f"{key}.html")
+
+def load_entry(url: str, cache_dir: str = CACHE_DIR) -> Optional[Dict]:
+    """캐시된 응답 조회 (메타데이터 + 본문)"""
+    meta_path, body_path = _paths(url, cache_dir)
+    if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "r", encoding="utf-8") as f:
+            meta["body"] = f.read()
+        return meta
+    except (OSError, ValueError):
+        return None
+
+def save_entry(url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+               cache_dir: str = CACHE_DIR) -> Dict:
+    meta_path, body_path = _paths(url, cache_dir)
+    meta = {
+        "url": url,
+        "etag": etag,
+        "last_modified": last_modified,
+        "body_hash": hashlib.sha256(body.encode("utf-8")).hexdigest(),
+        "fetched_at": time.time(),
+        "checked_at": time.time(),
+    }
+    with _write_lock:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 본문 먼저 교체 후 메타데이터 교체 (중간에 죽어도 해시가 어긋난 항목은 재검증됨)
+        for path, content in ((body_path, body), (meta_path, json.dumps(meta, ensure_ascii=False))):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+    return meta
+
+def _body_hash(entry: Dict) -> str:
+    return entry.get("body_hash") or hashlib.sha256(entry["body"].encode("utf-8")).hexdigest()
+
+def _touch_entry(url: str, entry: Dict, cache_dir: str):
+    meta_path, _ = _paths(url, cache_dir)
+    meta = {k: v for k, v in entry.items() if k != "body"}
+    meta["checked_at"] = time.time()
+    with _write_lock:
+        tmp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+def fetch_cached(url: str, session: Optional[requests.Session] = None, offline: bool = False,
+                 cache_dir: str = CACHE_DIR) -> Dict:
+    """
+    조건부 요청(ETag / Last-Modified)으로 URL 조회
+    반환: {"url", "body", "body_hash", "status": FETCHED | NOT_MODIFIED | CACHED}
+    캐시는 URL 기준으로 모든 스택이 공유하므로 NOT_MODIFIED는 "이 스택의 청크가 최신"이라는 뜻이 아님
+    (청크를 만든 본문인지는 호출자가 body_hash로 확인)
+    """
+    entry = load_entry(url, cache_dir)
+
+    if offline:
+        if entry is None:
+            raise CacheMiss(f"캐시에 없는 URL: {url}")
+        return {"url": url, "body": entry["body"], "body_hash": _body_hash(entry), "status": CACHED}
+
+    headers = dict(HTTP_HEADERS)
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    client = session or requests
+    response = client.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+
+    if response.status_code == 304 and entry:
+        _touch_entry(url, entry, cache_dir)
+        return {"url": url, "body": entry["body"], "body_hash": _body_hash(entry), "status": NOT_MODIFIED}
+
+    response.raise_for_status()
+    # charset 없는 text/html은 requests가 ISO-8859-1로 가정하므로 본문에서 인코딩 감지 (UTF-8/한글 페이지 깨짐 방지)
+    if "charset" not in response.headers.get("Content-Type", "").lower():
+        response.encoding = response.apparent_encoding
+    body = response.text
+
+    # 검증자를 지원하지 않는 서버: 본문 해시가 같으면 변경 없음으로 취급
+    meta = save_entry(url, body, response.headers.get("ETag"), response.headers.get("Last-Modified"), cache_dir)
+    status = NOT_MODIFIED if entry and entry.get("body_hash") == meta["body_hash"] else FETCHED
+    return {"url": url, "body": body, "body_hash": meta["body_hash"], "status": status}
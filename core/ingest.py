@@ -0,0 +1,386 @@
+# core/ingest.py
+import time
+import queue
+import threading
+from typing import List, Dict, Optional, Callable
+
+from core.database import (
+    create_http_session, parse_html, get_text_splitter,
+    load_vectorstore, write_chunks, assign_chunk_ids, get_source_state, get_parse_key, diff_source_chunks,
+    create_staging_collection, swap_collection, drop_collection, copy_chunks,
+)
+from core.model_loader import load_embedding_model
+from core.http_cache import fetch_cached
+from core.metrics import record_span, incr
+
+# 파이프라인 설정 (스테이지 사이 큐 크기가 곧 메모리 상한)
+FETCH_WORKERS = 8
+QUEUE_SIZE = 8
+EMBED_BATCH_SIZE = 32
+POLL_INTERVAL = 0.2
+COPY_BATCH_SIZE = 256
+
+STAGES = ["fetch", "parse", "split", "embed", "write"]
+
+_DONE = object()
+
+class PipelineCancelled(Exception):
+    pass
+
+class IngestionPipeline:
+    """
+    스트리밍 수집 파이프라인 (fetch → parse → split → embed → write)
+    각 스테이지는 별도 스레드이며 크기가 제한된 큐로 연결되어 동시에 진행된다.
+    split 단계에서 기존 컬렉션과 비교하여 새로 생기거나 바뀐 청크만 임베딩한다.
+    fetch는 HTTP 캐시로 조건부 요청을 보내며, 304인 페이지는 파싱/임베딩을 건너뛴다.
+    offline=True이면 네트워크 없이 캐시된 본문만으로 재구축한다.
+
+    결과는 스테이징 컬렉션에 기록되고(유지되는 청크는 기존 컬렉션에서 임베딩째 복사),
+    성공 시에만 활성 컬렉션과 교체된다. 실패/중단 시 기존 컬렉션은 그대로 유지.
+    """
+
+    def __init__(self, urls: List[str], stack_name: str, fetch_workers: int = FETCH_WORKERS,
+                 queue_size: int = QUEUE_SIZE, embed_batch_size: int = EMBED_BATCH_SIZE,
+                 offline: bool = False, staging_tag: Optional[str] = None):
+        self.urls = list(urls)
+        self.stack_name = stack_name
+        self.offline = offline
+        self.staging_tag = staging_tag or time.strftime("%Y%m%d%H%M%S")
+        self.fetch_workers = max(1, min(fetch_workers, len(self.urls) or 1))
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.errors: List[str] = []
+        self.fatal_error: Optional[BaseException] = None
+        self.counts = {
+            "fetch": 0, "parse": 0, "split": 0,   # URL 단위
+            "chunks": 0, "embed": 0, "write": 0,  # 청크 단위 (chunks = 임베딩 대상)
+            "failed": 0, "not_modified": 0,
+            "raw_chars": 0, "extracted_chars": 0,  # 원본 HTML / 추출한 본문 글자 수
+            "added": 0, "updated": 0, "removed": 0, "unchanged": 0,
+        }
+        self.url_status: Dict[str, str] = {url: "queued" for url in self.urls}
+        self._existing: Dict[str, Dict] = {}
+        self._parse_key = get_parse_key()
+        self._built_from: Dict[str, set] = {}  # source별 기존 청크를 만든 (parse_key, 페이지 body_hash)
+        self._keep_ids: List[str] = []
+        self._metadata_updates: Dict[str, Dict] = {}  # 유지되는 청크에 덮어쓸 메타데이터 (새 위치, parse_key, body_hash)
+        self.stage_seconds = {name: 0.0 for name in STAGES}
+
+    # --- 상태 공유 ---
+    def _incr(self, key: str, n: int = 1):
+        with self._lock:
+            self.counts[key] += n
+
+    def _add_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+        record_span(stage, seconds, pipeline="ingest")
+
+    def _error(self, url: str, error: Exception):
+        with self._lock:
+            self.errors.append(f"{url}: {error}")
+            self.counts["failed"] += 1
+            self.url_status[url] = f"failed: {error}"
+
+    def _set_status(self, url: str, status: str):
+        with self._lock:
+            self.url_status[url] = status
+
+    def _keep_existing(self, url: str):
+        """기존 청크를 그대로 유지 (변경 없음 / 수집 실패)"""
+        existing = self._existing.get(url, {})
+        with self._lock:
+            self._keep_ids.extend(existing)
+        return existing
+
+    def _is_current(self, url: str, body_hash: str) -> bool:
+        """source의 청크가 모두 이 본문과 현재 추출/청크 설정으로 만들어졌는지"""
+        return self._built_from.get(url) == {(self._parse_key, body_hash)}
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "total": len(self.urls),
+                **self.counts,
+                "stage_seconds": dict(self.stage_seconds),
+                "errors": list(self.errors),
+                "url_status": dict(self.url_status),
+            }
+
+    # --- 큐 헬퍼 (중단 시 블로킹 해제) ---
+    def _put(self, q: queue.Queue, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+        raise PipelineCancelled()
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        raise PipelineCancelled()
+
+    def _run_stage(self, name: str, target: Callable):
+        def runner():
+            try:
+                target()
+            except PipelineCancelled:
+                pass
+            except BaseException as e:
+                with self._lock:
+                    if self.fatal_error is None:
+                        self.fatal_error = e
+                self._stop.set()
+        t = threading.Thread(target=runner, name=f"ingest-{name}", daemon=True)
+        self._threads.append(t)
+        return t
+
+    # --- 스테이지 ---
+    def _fetch_stage(self, url_q: queue.Queue, html_q: queue.Queue):
+        session = create_http_session(pool_size=self.fetch_workers)
+        remaining = [self.fetch_workers]
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        url = url_q.get_nowait()
+                    except queue.Empty:
+                        return
+                    start = time.perf_counter()
+                    try:
+                        response = fetch_cached(url, session=session, offline=self.offline)
+                    except Exception as e:
+                        self._error(url, e)
+                        response = None
+                    self._add_time("fetch", time.perf_counter() - start)
+                    self._incr("fetch")
+                    if response is None:
+                        # 수집 실패: 기존 청크 유지
+                        self._keep_existing(url)
+                        continue
+                    if self._existing.get(url) and self._is_current(url, response["body_hash"]):
+                        # 기존 청크가 같은 본문/설정으로 만들어짐: 그대로 유지하고 파싱/청킹/임베딩 생략
+                        # (HTTP 캐시는 스택 간 공유라 304만으로는 이 스택의 청크가 최신인지 알 수 없음)
+                        existing = self._keep_existing(url)
+                        with self._lock:
+                            self.counts["not_modified"] += 1
+                            self.counts["unchanged"] += len(existing)
+                            self.counts["parse"] += 1
+                            self.counts["split"] += 1
+                            self.url_status[url] = "not_modified"
+                        continue
+                    self._set_status(url, "fetched")
+                    self._put(html_q, (url, response["body"], response["body_hash"]))
+            finally:
+                with self._lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    session.close()
+                    self._put(html_q, _DONE)
+
+        for i in range(self.fetch_workers):
+            self._run_stage(f"fetch-{i}", worker)
+
+    def _parse_stage(self, html_q: queue.Queue, doc_q: queue.Queue):
+        while True:
+            item = self._get(html_q)
+            if item is _DONE:
+                self._put(doc_q, _DONE)
+                return
+            url, html, body_hash = item
+            start = time.perf_counter()
+            try:
+                docs, stats = parse_html(url, html)
+            except Exception as e:
+                self._error(url, e)
+                docs, stats = [], None
+            self._add_time("parse", time.perf_counter() - start)
+            self._incr("parse")
+            if stats:
+                with self._lock:
+                    self.counts["raw_chars"] += stats["raw_chars"]
+                    self.counts["extracted_chars"] += stats["extracted_chars"]
+                    self.url_status[url] = (
+                        f"parsed ({stats['extracted_chars']:,}/{stats['raw_chars']:,} chars, "
+                        f"{stats['sections']} sections, {stats['code_blocks']} code blocks)"
+                    )
+            if docs:
+                for doc in docs:
+                    doc.metadata["body_hash"] = body_hash
+                self._put(doc_q, (url, docs))
+            else:
+                # 본문을 찾지 못한 경우 기존 청크 유지
+                self._keep_existing(url)
+                self._incr("split")
+
+    def _split_stage(self, doc_q: queue.Queue, chunk_q: queue.Queue):
+        splitter = get_text_splitter(self.stack_name)
+        batch = []
+        while True:
+            item = self._get(doc_q)
+            if item is _DONE:
+                if batch:
+                    self._put(chunk_q, batch)
+                self._put(chunk_q, _DONE)
+                return
+            url, docs = item
+            start = time.perf_counter()
+            splits = assign_chunk_ids(splitter.split_documents(docs))
+            for chunk in splits:
+                chunk.metadata["parse_key"] = self._parse_key
+            existing = self._existing.get(url, {})
+            pending, _, stats = diff_source_chunks(splits, existing)
+            self._add_time("split", time.perf_counter() - start)
+            pending_ids = {c.id for c in pending}
+            body_hash = docs[0].metadata["body_hash"]
+            rebuilt = not self._is_current(url, body_hash)
+            with self._lock:
+                # 내용이 같은 청크만 기존 컬렉션에서 복사, 사라진 청크는 복사하지 않음 (= 삭제)
+                # 앞에 청크가 추가/삭제되어 위치가 바뀐 청크는 chunk_index를 새 위치로 갱신 (인접 청크 병합 기준)
+                # 본문/설정이 바뀌어 다시 파싱한 source는 유지되는 청크의 parse_key/body_hash도 갱신
+                for c in splits:
+                    if c.id in existing and c.id not in pending_ids:
+                        self._keep_ids.append(c.id)
+                        updates = {}
+                        if existing[c.id] != c.metadata["chunk_index"]:
+                            updates["chunk_index"] = c.metadata["chunk_index"]
+                        if rebuilt:
+                            updates["parse_key"] = self._parse_key
+                            updates["body_hash"] = body_hash
+                        if updates:
+                            self._metadata_updates[c.id] = updates
+                for k, v in stats.items():
+                    self.counts[k] += v
+                self.url_status[url] += f" → {len(splits)} chunks, {len(pending)} new"
+            self._incr("split")
+            self._incr("chunks", len(pending))
+            for chunk in pending:
+                batch.append(chunk)
+                if len(batch) >= self.embed_batch_size:
+                    self._put(chunk_q, batch)
+                    batch = []
+
+    def _embed_stage(self, chunk_q: queue.Queue, vector_q: queue.Queue):
+        embedding = load_embedding_model()
+        while True:
+            item = self._get(chunk_q)
+            if item is _DONE:
+                self._put(vector_q, _DONE)
+                return
+            start = time.perf_counter()
+            vectors = embedding.embed_documents([c.page_content for c in item])
+            self._add_time("embed", time.perf_counter() - start)
+            self._incr("embed", len(item))
+            self._put(vector_q, (item, vectors))
+
+    def _write_stage(self, vector_q: queue.Queue, vectorstore):
+        while True:
+            item = self._get(vector_q)
+            if item is _DONE:
+                return
+            chunks, vectors = item
+            start = time.perf_counter()
+            write_chunks(vectorstore, chunks, vectors)
+            self._add_time("write", time.perf_counter() - start)
+            self._incr("write", len(chunks))
+
+    def _copy_kept_chunks(self, source, target):
+        """유지되는 청크를 임베딩째 복사 (모델 호출 없음)"""
+        ids = self._keep_ids
+        for i in range(0, len(ids), COPY_BATCH_SIZE):
+            start = time.perf_counter()
+            copy_chunks(source, target, ids[i:i + COPY_BATCH_SIZE], batch_size=COPY_BATCH_SIZE, metadata_updates=self._metadata_updates)
+            self._add_time("write", time.perf_counter() - start)
+
+    # --- 실행 ---
+    def run(self, on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        파이프라인 실행. on_progress는 호출한 스레드(예: Streamlit 스크립트, 작업 워커)에서 주기적으로 호출된다.
+        """
+        url_q = queue.Queue()
+        for url in self.urls:
+            url_q.put(url)
+        html_q = queue.Queue(maxsize=self.queue_size)
+        doc_q = queue.Queue(maxsize=self.queue_size)
+        chunk_q = queue.Queue(maxsize=self.queue_size)
+        vector_q = queue.Queue(maxsize=self.queue_size)
+
+        live = load_vectorstore(self.stack_name)
+        staging = create_staging_collection(self.stack_name, self.staging_tag)
+        embedding = load_embedding_model()
+        cache_before = embedding.stats() if hasattr(embedding, "stats") else None
+        start = time.perf_counter()
+        self._existing, self._built_from = get_source_state(live)
+
+        self._fetch_stage(url_q, html_q)
+        self._run_stage("parse", lambda: self._parse_stage(html_q, doc_q))
+        self._run_stage("split", lambda: self._split_stage(doc_q, chunk_q))
+        self._run_stage("embed", lambda: self._embed_stage(chunk_q, vector_q))
+        writer = self._run_stage("write", lambda: self._write_stage(vector_q, staging))
+
+        swapped = False
+        try:
+            for t in self._threads:
+                t.start()
+            try:
+                while writer.is_alive():
+                    if on_progress:
+                        on_progress(self.snapshot())
+                    writer.join(timeout=POLL_INTERVAL)
+            finally:
+                # 정상 종료 시에는 모든 스테이지가 이미 끝난 상태, 예외/중단 시에는 나머지 스테이지 정리
+                self._stop.set()
+                for t in self._threads:
+                    t.join()
+
+            if self.fatal_error is not None:
+                raise self.fatal_error
+
+            # 스택에서 제거된 URL의 청크는 복사하지 않음 (= 삭제)
+            current = set(self.urls)
+            for source, ids in self._existing.items():
+                if source not in current:
+                    self._incr("removed", len(ids))
+
+            counts = self.snapshot()
+            # 내용이 같아도 다른 설정으로 다시 파싱한 경우 메타데이터 갱신을 위해 교체
+            changed = counts["added"] + counts["updated"] + counts["removed"] > 0 or bool(self._metadata_updates)
+            if changed:
+                self._copy_kept_chunks(live, staging)
+                swap_collection(self.stack_name, staging._collection.name)
+                swapped = True
+        finally:
+            if not swapped:
+                # 실패/중단 또는 변경 없음: 기존 컬렉션 유지
+                drop_collection(staging._collection.name)
+
+        result = self.snapshot()
+        result["elapsed"] = time.perf_counter() - start
+        result["swapped"] = swapped
+        if cache_before is not None:
+            cache_after = embedding.stats()
+            result["embed_cache"] = {
+                "hits": cache_after["hits"] - cache_before["hits"],
+                "misses": cache_after["misses"] - cache_before["misses"],
+            }
+        if on_progress:
+            on_progress(result)
+        for key in ("added", "updated", "removed", "unchanged"):
+            incr("ctrlf5_ingest_chunks_total", result[key], result=key)
+        incr("ctrlf5_ingest_urls_total", result["failed"], result="failed")
+        return result
+
+def run_ingestion(urls: List[str], stack_name: str, on_progress: Optional[Callable[[Dict], None]] = None, **kwargs) -> Dict:
+    """URL 목록을 스트리밍 파이프라인으로 수집/임베딩하여 스택 컬렉션을 재구축 (offline=True: 캐시만 사용)"""
+    return IngestionPipeline(urls, stack_name, **kwargs).run(on_progress=on_progress)
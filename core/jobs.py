@@ -0,0 +1,154 @@
+# core/jobs.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+
+from core.database import DB_PATH, RETIRE_GRACE_SECONDS, cleanup_orphan_collections
+
+JOBS_DB_PATH = os.getenv("CTRLF5_JOBS_DB_PATH", os.path.join(DB_PATH, "jobs.sqlite"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# 진행 상황 기록 주기 (파이프라인은 0.2초마다 보고하지만 DB에는 이 간격으로만 기록)
+PROGRESS_WRITE_INTERVAL = 1.0
+# 수집은 CPU/GPU(임베딩)를 많이 쓰므로 한 번에 한 작업만 실행
+MAX_WORKERS = 1
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _connect() -> sqlite3.Connection:
+    """작업 테이블 연결 (프로세스당 1회 생성, 이전 프로세스에서 중단된 작업 정리)"""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(JOBS_DB_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(JOBS_DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, stack TEXT NOT NULL, status TEXT NOT NULL,"
+            " urls TEXT NOT NULL, options TEXT NOT NULL, progress TEXT, result TEXT, error TEXT,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_stack ON jobs(stack, created_at)")
+        conn.commit()
+        _conn = conn
+        _recover()
+    return _conn
+
+def _recover():
+    """
+    프로세스 재시작 시 실행 중이던 작업은 실패 처리 (SQL만 실행, 컬렉션 정리는 첫 작업 전에 워커 스레드에서)
+    (활성 컬렉션은 교체 전까지 그대로이므로 질의에는 영향 없음)
+    """
+    _conn.execute(
+        "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+        (FAILED, "프로세스 종료로 중단됨", time.time(), *ACTIVE_STATUSES),
+    )
+    _conn.commit()
+
+def _cleanup_collections():
+    """
+    이 테이블의 작업이 남긴 컬렉션 정리 (작업 워커에서 첫 작업 전에 실행, 화면 렌더링을 막지 않도록)
+    - 실패한 작업: 교체되지 않은 스테이징 컬렉션
+    - 성공한 작업: 이후 다시 교체된 이전 컬렉션 (교체 후 유예 시간이 지난 것만)
+    """
+    with _lock:
+        rows = _connect().execute("SELECT id, status FROM jobs WHERE status IN (?, ?)", (FAILED, SUCCEEDED)).fetchall()
+    try:
+        dropped = cleanup_orphan_collections(
+            {row["id"] for row in rows if row["status"] == FAILED},
+            {row["id"] for row in rows if row["status"] == SUCCEEDED},
+            retired_before=time.time() - RETIRE_GRACE_SECONDS,
+        )
+        if dropped:
+            print(f"🧹 남은 스테이징 컬렉션 정리: {dropped}")
+    except Exception as e:
+        print(f"⚠️ 컬렉션 정리 실패: {e}")
+
+def _update(job_id: str, **fields):
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    with _lock:
+        conn = _connect()
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+def _row_to_job(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    for key in ("urls", "options", "progress", "result"):
+        job[key] = json.loads(job[key]) if job[key] else None
+    return job
+
+def get_job(job_id: str) -> Optional[Dict]:
+    with _lock:
+        row = _connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def get_active_job(stack_name: str) -> Optional[Dict]:
+    """스택의 대기/실행 중인 작업"""
+    with _lock:
+        row = _connect().execute(
+            "SELECT * FROM jobs WHERE stack = ? AND status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+            (stack_name, *ACTIVE_STATUSES),
+        ).fetchone()
+    return _row_to_job(row) if row else None
+
+def _run_job(job_id: str, urls: List[str], stack_name: str, options: Dict):
+    from core.ingest import run_ingestion
+
+    _update(job_id, status=RUNNING, started_at=time.time())
+    last_write = [0.0]
+
+    def on_progress(p):
+        now = time.monotonic()
+        if now - last_write[0] >= PROGRESS_WRITE_INTERVAL:
+            last_write[0] = now
+            _update(job_id, progress=json.dumps(p, ensure_ascii=False))
+
+    try:
+        result = run_ingestion(urls, stack_name, on_progress=on_progress, staging_tag=job_id, **options)
+    except Exception as e:
+        print(f"❌ 수집 작업 실패 ({stack_name}, {job_id}): {e}")
+        _update(job_id, status=FAILED, error=f"{type(e).__name__}: {e}", finished_at=time.time())
+        return
+    _update(
+        job_id, status=SUCCEEDED, finished_at=time.time(),
+        progress=json.dumps(result, ensure_ascii=False), result=json.dumps(result, ensure_ascii=False),
+    )
+
+def submit_ingestion(urls: List[str], stack_name: str, **options) -> str:
+    """
+    수집 작업을 백그라운드 워커에 등록하고 작업 ID 반환
+    같은 스택에 대기/실행 중인 작업이 있으면 새로 등록하지 않고 그 작업 ID를 반환한다.
+    """
+    global _executor
+    with _lock:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE stack = ? AND status IN (?, ?) LIMIT 1",
+            (stack_name, *ACTIVE_STATUSES),
+        ).fetchone()
+        if row:
+            return row["id"]
+        job_id = uuid.uuid4().hex[:12]
+        conn.execute(
+            "INSERT INTO jobs (id, stack, status, urls, options, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, stack_name, QUEUED, json.dumps(list(urls), ensure_ascii=False), json.dumps(options), time.time()),
+        )
+        conn.commit()
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ingest-job")
+            _executor.submit(_cleanup_collections)
+        _executor.submit(_run_job, job_id, list(urls), stack_name, options)
+    return job_id
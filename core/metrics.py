@@ -0,0 +1,178 @@
+# core/metrics.py
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+
+# 내보내기 설정 (둘 다 비어 있으면 메모리에만 집계)
+METRICS_JSONL_PATH = os.getenv("CTRLF5_METRICS_JSONL")
+METRICS_PORT = os.getenv("CTRLF5_METRICS_PORT")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+STAGE_HISTOGRAM = "ctrlf5_stage_seconds"
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = {}
+_histograms: Dict[Tuple[str, tuple], Dict] = {}
+_bucket_config: Dict[str, tuple] = {}
+_sink_lock = threading.Lock()
+_server = None  # None: 미시작, False: 시작 실패
+
+def _key(name: str, labels: Dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _emit(event: Dict):
+    if not METRICS_JSONL_PATH:
+        return
+    event["ts"] = time.time()
+    line = json.dumps(event, ensure_ascii=False)
+    with _sink_lock:
+        with open(METRICS_JSONL_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+def incr(name: str, value: float = 1, **labels):
+    """카운터 증가"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, value: float, buckets: Optional[tuple] = None, **labels):
+    """히스토그램에 값 기록"""
+    key = _key(name, labels)
+    with _lock:
+        bounds = _bucket_config.setdefault(name, buckets or DEFAULT_BUCKETS)
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"counts": [0] * len(bounds), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(bounds):
+            if value <= bound:
+                hist["counts"][i] += 1
+                break
+        hist["sum"] += value
+        hist["count"] += 1
+
+# --- 요청 단위 추적 (답변 1건의 단계별 지연 시간) ---
+class Trace:
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+        self.stats: Dict[str, float] = {}  # 시간 외의 값 (예: 컨텍스트 토큰 수)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.spans.append((stage, seconds))
+
+    def breakdown(self) -> Dict[str, float]:
+        """단계별 합계 (같은 단계가 여러 번 실행되면 합산)"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for stage, seconds in self.spans:
+                totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("ctrlf5_trace", default=None)
+
+@contextmanager
+def trace():
+    """이 블록 안에서 기록된 span을 모은다 (contextvars로 하위 스레드/태스크에 전파)"""
+    t = Trace()
+    token = _current_trace.set(t)
+    try:
+        yield t
+    finally:
+        _current_trace.reset(token)
+
+def record_span(stage: str, seconds: float, **labels):
+    observe(STAGE_HISTOGRAM, seconds, stage=stage, **labels)
+    t = _current_trace.get()
+    if t is not None:
+        t.add(stage, seconds)
+    _emit({"type": "span", "stage": stage, "seconds": seconds, **labels})
+
+def record_stat(name: str, value: float, **labels):
+    """답변 단위 값 기록 (카운터 누적 + 현재 trace의 stats)"""
+    incr(f"ctrlf5_{name}_total", value, **labels)
+    t = _current_trace.get()
+    if t is not None:
+        with t._lock:
+            t.stats[name] = t.stats.get(name, 0) + value
+    _emit({"type": "stat", "name": name, "value": value, **labels})
+
+@contextmanager
+def span(stage: str, **labels):
+    """블록 실행 시간을 단계 히스토그램과 현재 trace에 기록"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start, **labels)
+
+# --- 내보내기 ---
+def _format_labels(labels: tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in items)
+    return "{" + body + "}"
+
+def render_prometheus() -> str:
+    """Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for name in sorted({n for n, _ in _counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (n, labels), value in sorted(_counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name in sorted({n for n, _ in _histograms}):
+            bounds = _bucket_config[name]
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), hist in sorted(_histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(bounds, hist["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', str(bound)))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {hist['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: Optional[int] = None, host: str = "127.0.0.1"):
+    """로컬 /metrics 엔드포인트 시작 (프로세스당 한 번, 포트 미설정 시 무시)"""
+    global _server
+    port = port or (int(METRICS_PORT) if METRICS_PORT else None)
+    with _lock:
+        if _server is not None or not port:
+            return _server or None
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            # Streamlit 재실행/다중 프로세스에서 포트가 이미 사용 중인 경우
+            print(f"⚠️ Metrics 서버 시작 실패: {e}")
+            _server = False
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
@@ -1,24 +1,64 @@
 # core/model_loader.py
-import streamlit as st
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+import os
+import functools
+import threading
+# langchain_openai / sentence-transformers(torch)는 로더 안에서 import (첫 화면 렌더링 지연 방지)
+from core.embedding_cache import CachedEmbeddings
+from core.rerank import RERANK_MAX_LENGTH
 
-@st.cache_resource
+EMBEDDING_MODEL_NAME = os.getenv("CTRLF5_EMBEDDING_MODEL", "BAAI/bge-m3")
+RERANKER_MODEL_NAME = os.getenv("CTRLF5_RERANKER_MODEL", "BAAI/bge-reranker-v2-m3")
+NORMALIZE_EMBEDDINGS = True
+
+def process_cache(func):
+    """
+    프로세스 전역 캐시 (st.cache_resource 대체)
+    Streamlit 세션 간에도, Streamlit 없이 CLI에서도 한 번만 로딩된다. 같은 인자의 동시 로딩은 하나로 합친다.
+    """
+    cache = {}
+    lock = threading.Lock()
+    key_locks = {}
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        if key in cache:
+            return cache[key]
+        with lock:
+            key_lock = key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in cache:
+                cache[key] = func(*args, **kwargs)
+        return cache[key]
+
+    return wrapper
+
+@process_cache
 def load_llm(model_name: str = "gpt-5-nano"):
     """LLM 모델 로딩 및 캐싱"""
+    from langchain_openai import ChatOpenAI
     return ChatOpenAI(model=model_name, temperature=0)
 
-@st.cache_resource
+@process_cache
 def load_embedding_model():
-    """임베딩 모델(BGE-M3) 로딩 및 캐싱 (CPU/GPU 메모리 절약)"""
-    return HuggingFaceEmbeddings(
-        model_name="BAAI/bge-m3",
+    """임베딩 모델(BGE-M3) 로딩 및 캐싱 (CPU/GPU 메모리 절약, 청크 임베딩은 디스크 캐시 사용)"""
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from core.broker import BatchedQueryEmbeddings, INFERENCE_BROKER_ENABLED
+    embeddings = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
         model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
+        encode_kwargs={'normalize_embeddings': NORMALIZE_EMBEDDINGS}
     )
+    if INFERENCE_BROKER_ENABLED:
+        # 세션별 질의 임베딩을 모아 배치 실행 (문서 임베딩/캐시는 그대로)
+        embeddings = BatchedQueryEmbeddings(embeddings)
+    return CachedEmbeddings(embeddings, model_name=EMBEDDING_MODEL_NAME, normalize=NORMALIZE_EMBEDDINGS)
 
-@st.cache_resource
+@process_cache
 def load_reranker_model():
-    """리랭커 모델(BGE-Reranker-M3) 로딩 및 캐싱"""
-    return HuggingFaceCrossEncoder(model_name="BAAI/bge-reranker-v2-m3")
\ No newline at end of file
+    """리랭커 모델(BGE-Reranker-M3) 로딩 및 캐싱 (입력 길이 상한으로 긴 청크 추론 비용 제한)"""
+    from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+    return HuggingFaceCrossEncoder(
+        model_name=RERANKER_MODEL_NAME,
+        model_kwargs={"max_length": RERANK_MAX_LENGTH}
+    )
\ No newline at end of file
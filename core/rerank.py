@@ -0,0 +1,124 @@
+# core/rerank.py
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+RERANK_BATCH_SIZE = 16
+RERANK_MAX_LENGTH = 512
+RERANK_CACHE_SIZE = 20000
+# 브로커가 여러 요청의 (질문, 문서) 쌍을 묶는 배치 크기 / 최대 대기 시간
+RERANK_BROKER_BATCH_SIZE = 64
+RERANK_BROKER_MAX_WAIT_MS = 10
+
+class ScoreCache:
+    """(정규화된 질문, 청크 해시) -> raw score LRU 캐시"""
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, score: float):
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._data)}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+# 리랭커 모델별 캐시
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_score_cache(reranker_model) -> ScoreCache:
+    name = getattr(reranker_model, "model_name", None) or str(id(reranker_model))
+    with _caches_lock:
+        return _caches.setdefault(name, ScoreCache())
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def chunk_hash(doc: Document) -> str:
+    return doc.metadata.get("content_hash") or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+def sigmoid(x: float) -> float:
+    return 1 / (1 + math.exp(-x))
+
+def _predict(reranker_model, pairs: List[List[str]], batch_size: int) -> List[float]:
+    # HuggingFaceCrossEncoder의 내부 sentence-transformers CrossEncoder(.client) 직접 사용 (배치 크기 지정)
+    scores = reranker_model.client.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+    if hasattr(scores, 'tolist'):
+        scores = scores.tolist()
+    # score가 array/tensor일 경우 float로 변환
+    return [float(s[0]) if isinstance(s, list) else float(s) for s in scores]
+
+# 리랭커 모델별 브로커
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+def get_rerank_batcher(reranker_model):
+    from core.broker import MicroBatcher
+    key = id(reranker_model)
+    with _batchers_lock:
+        if key not in _batchers:
+            _batchers[key] = MicroBatcher(
+                "rerank", lambda pairs: _predict(reranker_model, pairs, RERANK_BATCH_SIZE),
+                max_batch_size=RERANK_BROKER_BATCH_SIZE, max_wait_ms=RERANK_BROKER_MAX_WAIT_MS,
+            )
+        return _batchers[key]
+
+def predict_pairs(reranker_model, pairs: List[List[str]], batch_size: int = RERANK_BATCH_SIZE) -> List[float]:
+    """(질문, 문서) 쌍 채점 (브로커 사용 시 다른 세션의 요청과 묶어서 실행)"""
+    from core.broker import INFERENCE_BROKER_ENABLED
+    if not INFERENCE_BROKER_ENABLED:
+        return _predict(reranker_model, pairs, batch_size)
+    return get_rerank_batcher(reranker_model).submit(pairs)
+
+def score_documents(reranker_model, query: str, docs: List[Document], batch_size: int = RERANK_BATCH_SIZE) -> List[float]:
+    """
+    (query, doc) raw score 계산. 캐시에 있는 쌍과 같은 내용의 중복 청크는 다시 채점하지 않는다.
+    """
+    cache = get_score_cache(reranker_model)
+    q = normalize_query(query)
+    keys = [(q, chunk_hash(doc)) for doc in docs]
+
+    scores = {}
+    pending = {}
+    for key, doc in zip(keys, docs):
+        if key in scores or key in pending:
+            continue
+        cached = cache.get(key)
+        if cached is None:
+            pending[key] = doc.page_content
+        else:
+            scores[key] = cached
+
+    if pending:
+        raw = predict_pairs(reranker_model, [[query, text] for text in pending.values()], batch_size)
+        for key, score in zip(pending.keys(), raw):
+            cache.put(key, score)
+            scores[key] = score
+
+    return [scores[key] for key in keys]
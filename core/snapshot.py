@@ -0,0 +1,202 @@
+# core/snapshot.py
+"""
+스택 인덱스 스냅샷 내보내기/가져오기 (새 노드에 수집/임베딩 없이 인덱스 배포)
+스냅샷 = tar 파일 하나
+- manifest.json   형식 버전, 임베딩 모델, 저장 방식, URL 목록, source별 청크 content hash, 파일별 sha256
+- chunks.jsonl    청크 ID / 본문 / 메타데이터 (embeddings.npy와 같은 순서)
+- embeddings.npy  전체 차원 임베딩 (float32)
+- sparse.sqlite   BM25 역색인
+"""
+import io
+import os
+import json
+import time
+import shutil
+import hashlib
+import tarfile
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core import database
+from core.database import (
+    get_collection_name, get_collection_version, get_collection_storage, load_vectorstore, load_config, save_config,
+    read_vectors, write_vectors, create_staging_collection, drop_collection, swap_collection, ensure_sparse_index,
+)
+from core.model_loader import EMBEDDING_MODEL_NAME, NORMALIZE_EMBEDDINGS
+from core.metrics import span
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_SUFFIX = ".ctrlf5snap"
+MANIFEST_NAME = "manifest.json"
+CHUNKS_NAME = "chunks.jsonl"
+EMBEDDINGS_NAME = "embeddings.npy"
+SPARSE_NAME = "sparse.sqlite"
+SNAPSHOT_FILES = (CHUNKS_NAME, EMBEDDINGS_NAME, SPARSE_NAME)
+BATCH_SIZE = 256
+
+class SnapshotError(ValueError):
+    pass
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def default_snapshot_path(stack_name: str) -> str:
+    collection = get_collection_name(stack_name)
+    return f"{collection}-v{get_collection_version(collection)}{SNAPSHOT_SUFFIX}"
+
+def export_snapshot(stack_name: str, output_path: Optional[str] = None) -> Dict:
+    """현재 활성 컬렉션을 스냅샷 파일로 내보냄 (임베딩 재계산 없음). manifest 반환"""
+    output_path = output_path or default_snapshot_path(stack_name)
+    collection = get_collection_name(stack_name)
+    vectorstore = load_vectorstore(stack_name)
+    physical = vectorstore._collection.name
+    ids = list(vectorstore._collection.get(include=[])["ids"])
+    if not ids:
+        raise SnapshotError(f"'{stack_name}' 스택에 내보낼 청크가 없습니다.")
+
+    workdir = tempfile.mkdtemp(prefix="ctrlf5-snapshot-")
+    try:
+        with span("snapshot_export", pipeline="snapshot"):
+            sources: Dict[str, List[str]] = {}
+            vectors = []
+            with open(os.path.join(workdir, CHUNKS_NAME), "w", encoding="utf-8") as f:
+                for i in range(0, len(ids), BATCH_SIZE):
+                    data = read_vectors(vectorstore, ids[i:i + BATCH_SIZE])
+                    for chunk_id, document, metadata, vector in zip(data["ids"], data["documents"], data["metadatas"], data["embeddings"]):
+                        f.write(json.dumps({"id": chunk_id, "document": document, "metadata": metadata}, ensure_ascii=False) + "\n")
+                        vectors.append(np.asarray(vector, dtype=np.float32))
+                        metadata = metadata or {}
+                        sources.setdefault(metadata.get("source", ""), []).append(metadata.get("content_hash", ""))
+            np.save(os.path.join(workdir, EMBEDDINGS_NAME), np.stack(vectors))
+            ensure_sparse_index(vectorstore).backup(os.path.join(workdir, SPARSE_NAME))
+
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "stack": stack_name,
+                "collection": collection,
+                "collection_version": get_collection_version(collection),
+                "created_at": time.time(),
+                "embedding": {"model": EMBEDDING_MODEL_NAME, "normalize": NORMALIZE_EMBEDDINGS, "dims": int(vectors[0].shape[0])},
+                "storage": get_collection_storage(physical),
+                "chunking": {"chunk_size": database.CHUNK_SIZE, "chunk_overlap": database.CHUNK_OVERLAP},
+                "urls": load_config().get(stack_name, []),
+                "chunks": len(vectors),
+                "sources": {source: {"chunks": len(hashes), "content_hashes": sorted(hashes)} for source, hashes in sources.items()},
+                "files": {
+                    name: {"sha256": _sha256(os.path.join(workdir, name)), "bytes": os.path.getsize(os.path.join(workdir, name))}
+                    for name in SNAPSHOT_FILES
+                },
+            }
+
+            # manifest를 맨 앞에 두어 read_manifest가 전체를 읽지 않도록
+            tmp_path = f"{output_path}.{os.getpid()}.tmp"
+            with tarfile.open(tmp_path, "w") as tar:
+                payload = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+                info = tarfile.TarInfo(MANIFEST_NAME)
+                info.size, info.mtime = len(payload), int(manifest["created_at"])
+                tar.addfile(info, io.BytesIO(payload))
+                for name in SNAPSHOT_FILES:
+                    tar.add(os.path.join(workdir, name), arcname=name)
+            os.replace(tmp_path, output_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {**manifest, "path": output_path}
+
+def read_manifest(path: str) -> Dict:
+    with tarfile.open(path, "r") as tar:
+        try:
+            return json.load(tar.extractfile(MANIFEST_NAME))
+        except KeyError:
+            raise SnapshotError(f"스냅샷 manifest가 없습니다: {path}")
+
+def check_compatible(manifest: Dict):
+    """현재 노드 설정으로 사용할 수 있는 스냅샷인지 확인 (임베딩 모델이 다르면 검색 결과가 무의미)"""
+    if manifest.get("format", 0) > SNAPSHOT_FORMAT:
+        raise SnapshotError(f"지원하지 않는 스냅샷 형식입니다: {manifest.get('format')} (지원: {SNAPSHOT_FORMAT} 이하)")
+    embedding = manifest.get("embedding", {})
+    if embedding.get("model") != EMBEDDING_MODEL_NAME or embedding.get("normalize") != NORMALIZE_EMBEDDINGS:
+        raise SnapshotError(
+            f"임베딩 모델이 다릅니다: 스냅샷 {embedding.get('model')} (normalize={embedding.get('normalize')}), "
+            f"현재 {EMBEDDING_MODEL_NAME} (normalize={NORMALIZE_EMBEDDINGS})"
+        )
+
+def _extract_verified(path: str, manifest: Dict, workdir: str):
+    """알려진 파일만 꺼내고 sha256 검증"""
+    with tarfile.open(path, "r") as tar:
+        for name in SNAPSHOT_FILES:
+            try:
+                src = tar.extractfile(name)
+            except KeyError:
+                raise SnapshotError(f"스냅샷에 {name}이(가) 없습니다.")
+            with open(os.path.join(workdir, name), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            expected = manifest["files"][name]["sha256"]
+            if _sha256(os.path.join(workdir, name)) != expected:
+                raise SnapshotError(f"체크섬 불일치: {name} (파일이 손상되었습니다)")
+
+def import_snapshot(path: str, stack_name: Optional[str] = None) -> Dict:
+    """
+    스냅샷을 스택의 새 컬렉션으로 가져온 뒤 원자적으로 교체 (임베딩 계산 없음)
+    stack_name을 주지 않으면 스냅샷을 만든 스택 이름 사용. 스택 URL 목록도 스냅샷 기준으로 바꾼다.
+    """
+    manifest = read_manifest(path)
+    check_compatible(manifest)
+    stack_name = stack_name or manifest["stack"]
+
+    workdir = tempfile.mkdtemp(prefix="ctrlf5-snapshot-")
+    try:
+        _extract_verified(path, manifest, workdir)
+        embeddings = np.load(os.path.join(workdir, EMBEDDINGS_NAME), mmap_mode="r")
+        if embeddings.shape[0] != manifest["chunks"]:
+            raise SnapshotError(f"청크 수 불일치: manifest {manifest['chunks']}, 임베딩 {embeddings.shape[0]}")
+
+        staging = create_staging_collection(stack_name, f"import{time.strftime('%Y%m%d%H%M%S')}", storage=manifest.get("storage"))
+        physical = staging._collection.name
+        try:
+            with span("snapshot_import", pipeline="snapshot"):
+                with open(os.path.join(workdir, CHUNKS_NAME), "r", encoding="utf-8") as f:
+                    batch, offset = [], 0
+                    for line in f:
+                        batch.append(json.loads(line))
+                        if len(batch) == BATCH_SIZE:
+                            _write_batch(staging, batch, embeddings[offset:offset + len(batch)])
+                            offset += len(batch)
+                            batch = []
+                    if batch:
+                        _write_batch(staging, batch, embeddings[offset:offset + len(batch)])
+                        offset += len(batch)
+                if offset != manifest["chunks"] or staging._collection.count() != manifest["chunks"]:
+                    raise SnapshotError(f"청크 수 불일치: manifest {manifest['chunks']}, 가져온 청크 {offset}")
+                # 역색인은 다시 만들지 않고 스냅샷 파일을 그대로 사용
+                from core.sparse import drop_index, index_path
+                drop_index(database.DB_PATH, physical)
+                target = index_path(database.DB_PATH, physical)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(os.path.join(workdir, SPARSE_NAME), target)
+        except BaseException:
+            drop_collection(physical)
+            raise
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    swap_collection(stack_name, physical)
+    config = load_config()
+    config[stack_name] = manifest.get("urls", [])
+    save_config(config)
+    return {"stack": stack_name, "collection": physical, "chunks": manifest["chunks"], "manifest": manifest}
+
+def _write_batch(vectorstore, batch: List[Dict], embeddings):
+    write_vectors(
+        vectorstore,
+        ids=[c["id"] for c in batch],
+        documents=[c["document"] for c in batch],
+        metadatas=[c["metadata"] or None for c in batch],
+        embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+        index_sparse=False,
+    )
@@ -0,0 +1,228 @@
+# core/sparse.py
+"""
+컬렉션별 희소(BM25) 역색인
+- 코드 친화 토크나이저: snake_case / camelCase / 점 경로(a.b.c)를 통째로 + 조각으로, 한글은 음절 bigram
+- 컬렉션 옆 SQLite 파일에 저장 (term → posting 목록), 청크 upsert/삭제 시 증분 갱신
+- 질의 시 mmap으로 열고 질의 토큰의 posting만 읽어 채점 (전체 문서 순회 없음)
+"""
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Dict, Optional, Any
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+
+SPARSE_DIR = "sparse"
+BM25_K1 = 1.5
+BM25_B = 0.75
+MMAP_SIZE = 256 * 1024 * 1024
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)*")
+_HANGUL = re.compile(r"[가-힣]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or",
+    "that", "the", "this", "to", "with",
+}
+
+def _identifier_tokens(word: str) -> List[str]:
+    """create_history_aware_retriever → 전체 + create/history/aware/retriever, langchain_core.messages → 전체 + 경로 조각"""
+    tokens = [word.lower()]
+    parts = word.split(".")
+    if len(parts) > 1:
+        tokens.extend(p.lower() for p in parts)
+    for part in parts:
+        pieces = [piece for chunk in part.split("_") for piece in _CAMEL.findall(chunk)]
+        if len(pieces) > 1 or (pieces and pieces[0].lower() != part.lower()):
+            tokens.extend(piece.lower() for piece in pieces)
+    return [t for t in dict.fromkeys(tokens) if (t not in STOPWORDS and len(t) > 1) or t.isdigit()]
+
+def tokenize(text: str) -> List[str]:
+    """BM25 토큰 목록 (빈도 유지)"""
+    tokens = []
+    for word in _IDENTIFIER.findall(text):
+        tokens.extend(_identifier_tokens(word))
+    tokens.extend(_NUMBER.findall(text))
+    for word in _HANGUL.findall(text):
+        # 형태소 분석기 없이 조사/어미가 붙은 형태도 맞도록 음절 bigram (한 글자 단어는 그대로)
+        tokens.extend([word] if len(word) == 1 else [word[i:i + 2] for i in range(len(word) - 1)])
+    return tokens
+
+class SparseIndex:
+    """
+    BM25 역색인 (SQLite)
+    postings는 (term, doc) 기본키 순서로 저장되어 term별 posting을 범위 읽기로 가져온다.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, length INTEGER NOT NULL,
+                content TEXT NOT NULL, metadata TEXT
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL, doc INTEGER NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+            CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self._conn.commit()
+
+    def _stat(self, key: str) -> int:
+        row = self._conn.execute("SELECT value FROM stats WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _add_stat(self, key: str, delta: int):
+        self._conn.execute(
+            "INSERT INTO stats VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value", (key, delta)
+        )
+
+    def _delete_locked(self, ids: List[str]):
+        placeholders = ",".join("?" * len(ids))
+        rows = self._conn.execute(f"SELECT doc, length FROM docs WHERE id IN ({placeholders})", ids).fetchall()
+        if not rows:
+            return
+        docs = [r[0] for r in rows]
+        doc_placeholders = ",".join("?" * len(docs))
+        terms = self._conn.execute(
+            f"SELECT term, COUNT(*) FROM postings WHERE doc IN ({doc_placeholders}) GROUP BY term", docs
+        ).fetchall()
+        self._conn.executemany("UPDATE terms SET df = df - ? WHERE term = ?", [(n, t) for t, n in terms])
+        self._conn.execute("DELETE FROM terms WHERE df <= 0")
+        self._conn.execute(f"DELETE FROM postings WHERE doc IN ({doc_placeholders})", docs)
+        self._conn.execute(f"DELETE FROM docs WHERE doc IN ({doc_placeholders})", docs)
+        self._add_stat("docs", -len(rows))
+        self._add_stat("length", -sum(r[1] for r in rows))
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Optional[Dict]]):
+        """청크 추가/교체 (같은 ID는 이전 posting을 지우고 다시 색인)"""
+        if not ids:
+            return
+        with self._lock:
+            self._delete_locked(list(ids))
+            df = Counter()
+            total = 0
+            for chunk_id, content, metadata in zip(ids, documents, metadatas):
+                counts = Counter(tokenize(content or ""))
+                length = sum(counts.values())
+                total += length
+                doc = self._conn.execute(
+                    "INSERT INTO docs (id, length, content, metadata) VALUES (?, ?, ?, ?)",
+                    (chunk_id, length, content or "", json.dumps(metadata or {}, ensure_ascii=False)),
+                ).lastrowid
+                self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", [(t, doc, n) for t, n in counts.items()])
+                df.update(counts.keys())
+            self._conn.executemany(
+                "INSERT INTO terms VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df", list(df.items())
+            )
+            self._add_stat("docs", len(ids))
+            self._add_stat("length", total)
+            self._conn.commit()
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+        with self._lock:
+            self._delete_locked(list(ids))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._stat("docs")
+
+    def search(self, query: str, k: int) -> List[Document]:
+        """BM25 상위 k개 (질의 토큰이 하나라도 있는 문서만 채점)"""
+        query_terms = Counter(tokenize(query))
+        if not query_terms:
+            return []
+        with self._lock:
+            n_docs, total = self._stat("docs"), self._stat("length")
+            if not n_docs:
+                return []
+            placeholders = ",".join("?" * len(query_terms))
+            df = dict(self._conn.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", list(query_terms)).fetchall())
+            weights = [
+                (term, qtf * math.log(1 + (n_docs - df[term] + 0.5) / (df[term] + 0.5)))
+                for term, qtf in query_terms.items() if term in df
+            ]
+            if not weights:
+                return []
+            values = ",".join(["(?, ?)"] * len(weights))
+            avgdl = total / n_docs
+            rows = self._conn.execute(
+                f"""
+                WITH q(term, weight) AS (VALUES {values})
+                SELECT d.id, d.content, d.metadata,
+                       SUM(q.weight * p.tf * ({BM25_K1} + 1) / (p.tf + {BM25_K1} * (1 - {BM25_B} + {BM25_B} * d.length / ?))) AS score
+                FROM q JOIN postings p ON p.term = q.term JOIN docs d ON d.doc = p.doc
+                GROUP BY d.doc ORDER BY score DESC LIMIT ?
+                """,
+                [v for pair in weights for v in pair] + [avgdl, k],
+            ).fetchall()
+        return [
+            Document(page_content=content, metadata={**json.loads(metadata or "{}"), "bm25_score": score}, id=chunk_id)
+            for chunk_id, content, metadata, score in rows
+        ]
+
+    def backup(self, path: str):
+        """일관된 시점의 색인 사본 (쓰기 중에도 안전한 SQLite 온라인 백업)"""
+        with self._lock:
+            target = sqlite3.connect(path)
+            try:
+                self._conn.backup(target)
+            finally:
+                target.close()
+
+    def size_bytes(self) -> int:
+        return sum(os.path.getsize(self.path + s) for s in ("", "-wal") if os.path.exists(self.path + s))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class SparseRetriever(BaseRetriever):
+    """HybridRetriever의 희소 검색 leg (BM25Retriever 대체)"""
+    index: Any
+    k: int = 20
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.index.search(query, self.k)
+
+_indexes: Dict[str, SparseIndex] = {}
+_indexes_lock = threading.Lock()
+
+def index_path(db_path: str, physical: str) -> str:
+    return os.path.join(db_path, SPARSE_DIR, f"{physical}.sqlite")
+
+def get_index(db_path: str, physical: str) -> SparseIndex:
+    """컬렉션 역색인 (프로세스 안에서 연결 재사용)"""
+    path = index_path(db_path, physical)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = SparseIndex(path)
+        return index
+
+def drop_index(db_path: str, physical: str):
+    path = index_path(db_path, physical)
+    with _indexes_lock:
+        index = _indexes.pop(path, None)
+    if index is not None:
+        index.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
@@ -0,0 +1,84 @@
+# core/warmup.py
+"""
+앱 시작 직후 백그라운드에서 모델 로딩 + 첫 추론 실행
+첫 질문이 모델 로딩(디스크 → 메모리)과 첫 forward pass 비용을 떠안지 않도록 한다.
+"""
+import time
+import threading
+from typing import Dict, Optional
+
+from core.metrics import record_span
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+# (이름, 표시 이름) — 순서대로 로딩
+COMPONENTS = [
+    ("engine", "RAG 엔진 모듈"),
+    ("embedding", "임베딩 모델"),
+    ("reranker", "리랭커 모델"),
+]
+
+_lock = threading.Lock()
+_status: Dict[str, Dict] = {name: {"state": PENDING, "seconds": None, "error": None} for name, _ in COMPONENTS}
+_thread = None
+
+def _warm_engine():
+    # langchain_classic / langchain_community 등 질의 경로 모듈 import
+    import core.engine  # noqa: F401
+
+def _warm_embedding():
+    from core.model_loader import load_embedding_model
+    load_embedding_model().embed_query("warm up")
+
+def _warm_reranker():
+    from core.model_loader import load_reranker_model
+    from core.rerank import _predict
+    # 점수 캐시를 거치지 않고 직접 한 번 추론
+    _predict(load_reranker_model(), [["warm up", "warm up"]], batch_size=1)
+
+_WARMERS = {"engine": _warm_engine, "embedding": _warm_embedding, "reranker": _warm_reranker}
+
+def _set(name: str, **fields):
+    with _lock:
+        _status[name].update(fields)
+
+def _run():
+    for name, _ in COMPONENTS:
+        _set(name, state=LOADING)
+        start = time.perf_counter()
+        try:
+            _WARMERS[name]()
+        except Exception as e:
+            # 실패해도 첫 질문 시점에 다시 로딩을 시도하므로 앱은 계속 동작
+            print(f"⚠️ Warm-up 실패 ({name}): {e}")
+            _set(name, state=FAILED, error=str(e), seconds=time.perf_counter() - start)
+            continue
+        seconds = time.perf_counter() - start
+        record_span(f"warmup_{name}", seconds)
+        _set(name, state=READY, seconds=seconds)
+
+def start_warmup() -> bool:
+    """백그라운드 warm-up 시작 (프로세스당 1회, 이번 호출에서 시작했으면 True)"""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return False
+        _thread = threading.Thread(target=_run, name="model-warmup", daemon=True)
+        _thread.start()
+        return True
+
+def get_warmup_status() -> Dict[str, Dict]:
+    with _lock:
+        return {name: dict(status) for name, status in _status.items()}
+
+def is_ready() -> bool:
+    """모든 구성 요소가 준비되었는지 (실패한 항목은 첫 질문 때 다시 로딩되므로 완료로 간주)"""
+    return all(s["state"] in (READY, FAILED) for s in get_warmup_status().values())
+
+def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    if _thread is not None:
+        _thread.join(timeout)
+    return is_ready()
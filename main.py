@@ -1,15 +1,18 @@
+import time
+_import_start = time.perf_counter()
+
 import streamlit as st
 import os
 from dotenv import load_dotenv
 
-# 내부 모듈
-from core.database import load_vectorstore, load_config
-from core.engine import get_rag_chain
-from langchain_core.messages import HumanMessage, AIMessage
+# 내부 모듈 (RAG 엔진/모델은 warm-up 스레드 또는 첫 질문 시점에 import)
+from core.database import load_config
+from core.metrics import trace, start_metrics_server, record_span, incr
+from core.warmup import start_warmup, is_ready
 
 # UI & Logic 모듈
 from ui.sidebar import render_sidebar
-from ui.chat import render_chat_messages, render_input_area
+from ui.chat import render_chat_messages, render_input_area, render_sources, render_answer_meta, render_warmup_status
 
 # 1. 설정 및 스타일 로드
 load_dotenv()
@@ -21,6 +24,12 @@ def load_css(file_path):
 
 load_css("assets/style.css")
 
+# CTRLF5_METRICS_PORT가 설정된 경우 /metrics 엔드포인트 시작 (프로세스당 1회)
+start_metrics_server()
+# 임베딩/리랭커 모델 백그라운드 로딩 (프로세스당 1회, 최초 실행의 import 시간 기록)
+if start_warmup():
+    record_span("startup_import", time.perf_counter() - _import_start)
+
 # 2. 상태 초기화
 if "stacks" not in st.session_state:
     st.session_state.stacks = load_config()
@@ -29,7 +38,10 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 
 # 3. 사이드바 렌더링
-selected_stack, strict_mode, top_k = render_sidebar()
+selected_stack, extra_stacks, strict_mode, top_k, use_answer_cache, show_timings = render_sidebar()
+# 함께 검색할 스택이 있으면 여러 컬렉션 동시 검색
+search_stacks = [selected_stack, *extra_stacks] if extra_stacks else selected_stack
+stack_label = " + ".join([selected_stack, *extra_stacks])
 
 # 4. 메인 영역 헤더
 c1, c2 = st.columns([0.7, 0.3])
@@ -39,7 +51,7 @@ with c1:
             ⌨️ Ctrl + F5
             <span style="color: #e4e4e7; margin: 0 12px; font-weight: 300;">|</span>
             <span style="background-color: #f4f4f5; color: #18181b; padding: 4px 14px; border-radius: 8px; font-size: 24px; font-weight: 600;">
-                {selected_stack}
+                {stack_label}
             </span>
         </h2>
     """, unsafe_allow_html=True)
@@ -50,65 +62,96 @@ with c2:
         st.markdown("""<div style="text-align: right; padding-top: 15px;"><span style="background-color: #eff6ff; color: #1e40af; padding: 6px 12px; border-radius: 20px; font-size: 13px; font-weight: 600; display: inline-block; border: 1px solid #dbeafe;">🧠 일반 모드</span></div>""", unsafe_allow_html=True)
 
 st.caption("최신 공식 문서를 기반으로 질문하고, 확신을 가지고 코딩하세요.")
+if not is_ready():
+    render_warmup_status()
 
 if not os.getenv("OPENAI_API_KEY"):
     st.error("❌ .env 파일에 OPENAI_API_KEY를 설정해주세요.")
     st.stop()
 
 # 5. RAG 및 채팅 로직
-vectorstore = load_vectorstore(selected_stack)
-
 # 기존 메시지 출력
 render_chat_messages(st.session_state.messages)
 
-# RAG 답변 생성
+# RAG 답변 생성 (스트리밍)
+def stream_answer(rag_chain, inputs, state, sources_slot):
+    """체인 출력 스트림에서 근거 문서는 도착 즉시 렌더링하고, 답변 토큰은 그대로 전달"""
+    start = time.perf_counter()
+    for chunk in rag_chain.stream(inputs):
+        if chunk.get("cached"):
+            state["cached"] = True
+        if "context" in chunk:
+            state["sources"] = [
+                {
+                    "source": source_link(doc.metadata, '알 수 없음'),
+                    "content": doc.page_content,
+                    "score": doc.metadata.get('relevance_score', 0.0),
+                    "stack": doc.metadata.get('stack'),
+                }
+                for doc in chunk["context"]
+            ]
+            with sources_slot.container():
+                render_sources(state["sources"])
+        if chunk.get("answer"):
+            if state["ttft"] is None:
+                state["ttft"] = time.perf_counter() - start
+            yield chunk["answer"]
+
 if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
+    from core.engine import get_cached_rag_chain
+    from core.answer_cache import with_answer_cache
+    from core.extract import source_link
+    from core.history import to_messages
+
     last_user_msg = st.session_state.messages[-1]["content"]
     with st.chat_message("assistant"):
-        history = [HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"]) for m in st.session_state.messages[:-1]]
-        with st.spinner("최신 문서 분석 중..."):
-            try:
-                rag_chain = get_rag_chain(vectorstore, selected_stack, is_strict=strict_mode, relevance_threshold=0.5, top_k=top_k)
-                response = rag_chain.invoke({"input": last_user_msg, "chat_history": history})
-                answer_text = response['answer']
-                
-                if strict_mode and "제공된 문서에서 해당 내용에 대한 근거를 찾을 수 없습니다" in answer_text:
-                    st.warning("⚠️ **정보 부족 (Strict Mode)**\n\n문서에서 근거를 찾지 못했습니다.")
-                    st.session_state.messages.append({"role": "assistant", "content": answer_text})
-                else:
-                    st.markdown(answer_text)
-                    
-                    # 참조 문서 데이터 추출 및 저장
-                    sources_data = []
-                    if response.get('context'):
-                        with st.expander("🔍 참조 문서 (Source)"):
-                            for i, doc in enumerate(response['context']):
-                                score = doc.metadata.get('relevance_score', 0.0)
-                                source = doc.metadata.get('source', '알 수 없음')
-                                content = doc.page_content
-                                
-                                # 데이터 저장용
-                                sources_data.append({
-                                    "source": source,
-                                    "content": content,
-                                    "score": score
-                                })
-                                
-                                # 즉시 렌더링
-                                st.markdown(f"**🔗 출처 {i+1}:** `{source}` (Score: {score:.4f})")
-                                st.caption(content[:250].replace("\n", " ") + "...")
-                                st.divider()
-                    elif not strict_mode:
-                        st.info("일반 지식 활용")
-
-                    st.session_state.messages.append({
-                        "role": "assistant", 
-                        "content": answer_text,
-                        "sources": sources_data
-                    })
-
-            except Exception as e:
-                st.error(f"오류 발생: {e}")
+        # 체인이 최근 턴 + 요약으로 줄여서 사용 (core/history.py)
+        history = to_messages(st.session_state.messages[:-1])
+        answer_slot = st.empty()
+        sources_slot = st.empty()
+        answer_slot.caption("⏳ 최신 문서 분석 중...")
+        try:
+            rag_chain = get_cached_rag_chain(search_stacks, is_strict=strict_mode, relevance_threshold=0.5, top_k=top_k)
+            if use_answer_cache:
+                rag_chain = with_answer_cache(rag_chain, search_stacks, strict_mode)
+
+            state = {"sources": [], "ttft": None, "cached": False}
+            incr("ctrlf5_queries_total", stack=stack_label)
+            with trace() as answer_trace:
+                start = time.perf_counter()
+                with answer_slot.container():
+                    answer_text = st.write_stream(
+                        stream_answer(rag_chain, {"input": last_user_msg, "chat_history": history}, state, sources_slot)
+                    )
+                record_span("answer", time.perf_counter() - start)
+            timings = answer_trace.breakdown() if show_timings else None
+            if timings and state["sources"]:
+                with sources_slot.container():
+                    render_sources(state["sources"], timings)
+            if not isinstance(answer_text, str):
+                answer_text = "".join(str(part) for part in answer_text)
+
+            if strict_mode and "제공된 문서에서 해당 내용에 대한 근거를 찾을 수 없습니다" in answer_text:
+                answer_slot.warning("⚠️ **정보 부족 (Strict Mode)**\n\n문서에서 근거를 찾지 못했습니다.")
+                sources_slot.empty()
+                st.session_state.messages.append({"role": "assistant", "content": answer_text, "ttft": state["ttft"]})
+            else:
+                if not state["sources"] and not strict_mode:
+                    sources_slot.info("일반 지식 활용")
+                render_answer_meta(state["ttft"], state["cached"], answer_trace.stats)
+
+                st.session_state.messages.append({
+                    "role": "assistant", 
+                    "content": answer_text,
+                    "sources": state["sources"],
+                    "ttft": state["ttft"],
+                    "cached": state["cached"],
+                    "timings": timings,
+                    "context_stats": dict(answer_trace.stats),
+                })
+
+        except Exception as e:
+            st.error(f"오류 발생: {e}")
 
 # 6. 입력 영역
 render_input_area()
\ No newline at end of file
@@ -2,6 +2,60 @@ import streamlit as st
 import streamlit.components.v1 as components
 from core.callbacks import append_to_prompt, send_message_callback
 
+# 지연 시간 표시 순서 / 이름
+TIMING_LABELS = [
+    ("rephrase", "질문 재구성"),
+    ("vector_search", "벡터 검색"),
+    ("bm25", "BM25"),
+    ("fusion", "RRF 결합"),
+    ("rerank", "리랭크"),
+    ("threshold_filter", "점수 필터"),
+    ("context_packing", "컨텍스트 조립"),
+    ("generation_first_token", "첫 토큰"),
+    ("generation", "답변 생성"),
+]
+
+def render_timings(timings):
+    """단계별 소요 시간 출력"""
+    rows = [f"| {label} | {timings[key] * 1000:.0f} ms |" for key, label in TIMING_LABELS if key in timings]
+    if rows:
+        st.markdown("**⏱️ 단계별 소요 시간**\n\n| 단계 | 시간 |\n|---|---|\n" + "\n".join(rows))
+
+def render_sources(sources, timings=None):
+    """참조 문서 목록 출력 (timings가 있으면 단계별 소요 시간도 함께)"""
+    with st.expander("🔍 참조 문서 (Source)"):
+        for i, doc in enumerate(sources):
+            score = doc.get("score", 0.0)
+            stack = f" `[{doc['stack']}]`" if doc.get("stack") else ""
+            st.markdown(f"**🔗 출처 {i+1}:**{stack} `{doc.get('source', '알 수 없음')}` (Score: {score:.4f})")
+            st.caption(doc.get("content", "")[:250].replace("\n", " ") + "...")
+            st.divider()
+        if timings:
+            render_timings(timings)
+
+def render_answer_meta(ttft=None, cached=False, context_stats=None):
+    """답변 부가 정보 (첫 토큰 지연, 캐시 여부, 컨텍스트 토큰 수)"""
+    parts = []
+    if cached:
+        parts.append("⚡ 캐시된 답변")
+    if ttft is not None:
+        parts.append(f"⏱️ 첫 토큰 {ttft:.2f}초")
+    if context_stats and "context_tokens" in context_stats:
+        parts.append(f"📄 컨텍스트 {context_stats['context_tokens']:,.0f} 토큰 (절감 {context_stats.get('context_tokens_saved', 0):,.0f})")
+    if parts:
+        st.caption(" · ".join(parts))
+
+@st.fragment(run_every=1.0)
+def render_warmup_status():
+    """모델 준비 상태 (준비가 끝나면 전체 화면을 한 번 다시 그려 표시를 없앰)"""
+    from core.warmup import get_warmup_status, is_ready, COMPONENTS, READY, FAILED
+    if is_ready():
+        st.rerun()
+    status = get_warmup_status()
+    icons = {READY: "✅", FAILED: "⚠️"}
+    parts = [f"{icons.get(status[name]['state'], '⏳')} {label}" for name, label in COMPONENTS]
+    st.caption("🔥 모델 준비 중 (첫 답변이 느릴 수 있습니다) · " + " · ".join(parts))
+
 def render_chat_messages(messages):
     for m in messages:
         with st.chat_message(m["role"]):
@@ -12,12 +66,9 @@ def render_chat_messages(messages):
                  
                  # 저장된 참조 문서가 있으면 출력
                  if "sources" in m and m["sources"]:
-                     with st.expander("🔍 참조 문서 (Source)"):
-                         for i, doc in enumerate(m["sources"]):
-                             score = doc.get("score", 0.0)
-                             st.markdown(f"**🔗 출처 {i+1}:** `{doc.get('source', '알 수 없음')}` (Score: {score:.4f})")
-                             st.caption(doc.get("content", "")[:250].replace("\n", " ") + "...")
-                             st.divider()
+                     render_sources(m["sources"], m.get("timings"))
+                 if m["role"] == "assistant":
+                     render_answer_meta(m.get("ttft"), m.get("cached", False), m.get("context_stats"))
 
 def render_input_area():
     st.divider()
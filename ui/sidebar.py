@@ -1,9 +1,14 @@
 import streamlit as st
-import time
-from core.database import fetch_url_content, build_vectorstore, save_config
+from core.database import save_config, remove_source
+from core.jobs import submit_ingestion, get_job, get_active_job, QUEUED, RUNNING, FAILED
 from core.callbacks import add_stack_callback, add_url_callback
 
 def render_sidebar():
+    if "ingest_jobs" not in st.session_state:
+        st.session_state.ingest_jobs = {}  # 스택 → 이 세션에서 등록한 작업 ID
+    if "ingest_errors" not in st.session_state:
+        st.session_state.ingest_errors = {}  # 스택 → 마지막 작업 실패 메시지 (닫거나 다시 업데이트할 때까지 표시)
+
     with st.sidebar:
         st.markdown("""
             <h1 style="font-family: 'Inter', sans-serif; font-weight: 800; color: #18181b; font-size: 24px; margin-bottom: 10px;">
@@ -15,6 +20,18 @@ def render_sidebar():
         strict_mode = st.toggle("🛡️ 엄격 모드", value=True, 
                                 help="켜기: 문서에 있는 내용만 대답합니다.\n끄기: AI의 일반 지식도 함께 사용합니다.")
         
+        use_answer_cache = st.toggle("⚡ 답변 캐시", value=False,
+                                     help="같거나 매우 비슷한 질문에는 저장된 답변을 재사용합니다. (스택 재구축 시 초기화)\n"
+                                          "대화의 첫 질문에만 적용됩니다. 이어지는 질문은 앞 대화에 따라 뜻이 달라지므로 "
+                                          "캐시를 사용하지 않습니다. (새로고침하면 새 대화로 시작)")
+        if use_answer_cache:
+            from core.answer_cache import answer_cache
+            cache = answer_cache.stats()
+            st.caption(f"캐시 hit {cache['hits']} · miss {cache['misses']} · 저장 {cache['entries']}개 (전체 세션)")
+        
+        show_timings = st.toggle("⏱️ 지연 시간 분석", value=False,
+                                 help="답변마다 단계별(재구성, 검색, 리랭크, 생성) 소요 시간을 참조 문서 영역에 표시합니다.")
+        
         st.caption("참조 문서 개수 (Top-K)")
         top_k = st.slider("참조 문서 개수", min_value=1, max_value=20, value=5, label_visibility="collapsed",
                           help="최종적으로 LLM에 전달할 문서의 최대 개수입니다.")
@@ -29,6 +46,10 @@ def render_sidebar():
 
         selected_stack = st.selectbox("스택 선택", stack_list, index=idx, key="current_stack_selection", label_visibility="collapsed")
         
+        other_stacks = [s for s in stack_list if s != selected_stack]
+        extra_stacks = st.multiselect("🔀 함께 검색할 스택", other_stacks, key="extra_stack_selection",
+                                      help="선택한 스택들의 문서를 동시에 검색해 하나의 답변으로 합칩니다. (예: LangChain + Pydantic)")
+
         with st.expander("➕ 새 스택 추가"):
             st.text_input("스택 이름", key="new_stack_input", on_change=add_stack_callback)
 
@@ -39,14 +60,17 @@ def render_sidebar():
         st.text_input("URL 추가", placeholder="https://docs...", key="new_url_input", on_change=add_url_callback, label_visibility="collapsed")
 
         urls = st.session_state.stacks.get(selected_stack, [])
+        # 수집 작업 중에는 삭제 불가 (작업이 기존 컬렉션에서 청크를 복사한 뒤 교체하므로 삭제가 되돌아감)
+        active_job = get_active_job(selected_stack)
         if urls:
             with st.container(border=True):
                 for i, url in enumerate(urls):
                     c1, c2 = st.columns([0.75, 0.25])
                     c1.text(f"{url[:20]}...")
-                    if c2.button("🗑️", key=f"del_{i}", help="삭제", use_container_width=True):
-                        st.session_state.stacks[selected_stack].pop(i)
+                    if c2.button("🗑️", key=f"del_{i}", help="삭제", use_container_width=True, disabled=active_job is not None):
+                        removed_url = st.session_state.stacks[selected_stack].pop(i)
                         save_config(st.session_state.stacks)
+                        remove_source(selected_stack, removed_url)
                         st.rerun()
             st.caption(f"총 {len(urls)}개의 문서")
         else:
@@ -54,29 +78,78 @@ def render_sidebar():
 
         st.divider()
 
-        if st.button("🔄 RAG 엔진 업데이트", type="primary", use_container_width=True):
+        offline = st.checkbox("📴 오프라인 (캐시만 사용)", value=False,
+                              help="네트워크 요청 없이 로컬 HTTP 캐시에 저장된 문서만으로 재구축합니다.")
+
+        if st.button("🔄 RAG 엔진 업데이트", type="primary", use_container_width=True, disabled=active_job is not None):
             if not urls:
                 st.warning("URL을 먼저 추가해주세요.")
             else:
-                with st.status(f"🚀 '{selected_stack}' 엔진 구축 중...", expanded=True) as status:
-                    all_docs = []
-                    start_time = time.time()
-                    bar = st.progress(0)
-                    for i, url in enumerate(urls):
-                        st.write(f"📥 수집 중: `{url}`")
-                        docs = fetch_url_content(url)
-                        if docs: all_docs.extend(docs)
-                        bar.progress((i + 1) / len(urls))
-                        time.sleep(0.05)
-                    if all_docs:
-                        build_vectorstore(all_docs, selected_stack)
-                        elapsed = time.time() - start_time
-                        status.update(label=f"✅ 완료! ({elapsed:.1f}초)", state="complete", expanded=False)
-                        st.success("업데이트 완료!")
-                        time.sleep(1)
-                        st.rerun()
-                    else:
-                        status.update(label="❌ 실패", state="error")
-                        st.error("문서 내용을 찾을 수 없습니다.")
+                st.session_state.ingest_errors.pop(selected_stack, None)
+                st.session_state.ingest_jobs[selected_stack] = submit_ingestion(urls, selected_stack, offline=offline)
+
+        error = st.session_state.ingest_errors.get(selected_stack)
+        if error:
+            st.error(error)
+            if st.button("닫기", key="dismiss_ingest_error", use_container_width=True):
+                del st.session_state.ingest_errors[selected_stack]
+                st.rerun()
+
+        job_id = st.session_state.ingest_jobs.get(selected_stack) or (active_job and active_job["id"])
+        if job_id:
+            render_job_status(job_id, selected_stack)
+
+        return selected_stack, extra_stacks, strict_mode, top_k, use_answer_cache, show_timings
+
+@st.fragment(run_every=1.0)
+def render_job_status(job_id: str, stack_name: str):
+    """백그라운드 수집 작업 상태 (이 영역만 주기적으로 다시 그림)"""
+    job = get_job(job_id)
+    if job is None:
+        return
+
+    if job["status"] in (QUEUED, RUNNING):
+        p = job["progress"]
+        with st.status(f"🚀 '{stack_name}' 엔진 구축 중... (기존 인덱스로 계속 질문 가능)", expanded=True):
+            if p is None:
+                st.caption("⏳ 대기 중")
+                return
+            total = max(p["total"], 1)
+            chunks = max(p["chunks"], 1)
+            st.progress(p["fetch"] / total, text=f"📥 수집 {p['fetch']}/{p['total']}")
+            st.progress(p["parse"] / total, text=f"🧾 파싱 {p['parse']}/{p['total']}")
+            st.progress(p["split"] / total, text=f"✂️ 청킹 {p['split']}/{p['total']} ({p['chunks']} chunks)")
+            st.progress(min(p["embed"] / chunks, 1.0), text=f"🧠 임베딩 {p['embed']}/{p['chunks']}")
+            st.progress(min(p["write"] / chunks, 1.0), text=f"💾 저장 {p['write']}/{p['chunks']}")
+            with st.expander("URL별 상태"):
+                for url, url_status in p.get("url_status", {}).items():
+                    st.caption(f"`{url}` · {url_status}")
+        return
+
+    # 완료된 작업은 한 번만 알리고 전체 화면을 다시 그림 (체인 캐시가 새 컬렉션 버전을 사용)
+    if st.session_state.ingest_jobs.get(stack_name) != job_id:
+        return
+    del st.session_state.ingest_jobs[stack_name]
+    result = job["result"]
+    # 실패 메시지는 이 영역이 더 이상 그려지지 않으므로 세션에 남겨 사이드바에 표시
+    if job["status"] == FAILED:
+        st.session_state.ingest_errors[stack_name] = f"엔진 구축 중 오류 발생: {job['error']}"
+        st.rerun()
+    for err in result["errors"]:
+        st.toast(f"⚠️ {err}")
+    if not result["split"]:
+        st.session_state.ingest_errors[stack_name] = "문서 내용을 찾을 수 없습니다."
+        st.rerun()
+    if result["raw_chars"]:
+        st.toast(f"🧾 본문 추출 {result['extracted_chars']:,}/{result['raw_chars']:,}자 ({result['extracted_chars'] / result['raw_chars']:.0%})")
+    st.toast(
+        f"📊 추가 {result['added']} · 수정 {result['updated']} · "
+        f"삭제 {result['removed']} · 유지 {result['unchanged']} "
+        f"(변경 없는 페이지 {result['not_modified']})"
+    )
+    if result.get("embed_cache"):
+        cache = result["embed_cache"]
+        st.toast(f"🧠 임베딩 캐시 hit {cache['hits']} · miss {cache['misses']}")
+    st.toast(f"✅ 업데이트 완료! ({result['elapsed']:.1f}초)")
+    st.rerun()
 
-        return selected_stack, strict_mode, top_k